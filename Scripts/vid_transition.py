@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 __package__ = "vid_transition"
+import sys
+import time
 import math
 import pathlib
 import enum
@@ -9,10 +11,31 @@ import shutil
 import subprocess
 import argparse
 import tempfile
+import threading
+import queue
+import collections
+import concurrent.futures
+import contextlib
+import os
+import hashlib
+import json
+import mmap
+import fractions
+import webbrowser
+from multiprocessing import shared_memory, resource_tracker
 from PIL import Image, ImageOps, ImageEnhance, ImageFilter
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import resource
+except ImportError:
+    resource = None
 
 # default variables used in arg-parser
 INPUT_VIDEOS = []
+MANIFEST = ""
 OUTPUT = ""
 NUM_FRAMES = 10
 ANIMATION = "rotation"
@@ -25,11 +48,64 @@ DEBUG = False
 ART = True
 REMOVE_ORIGINAL = False
 MERGE_PHASES = False
+JOBS = 0
+DISTORTION_ENGINE = "mesh"
+BLUR_ENGINE = "gaussian"
+FRAME_TRANSPORT = "shared_memory"
+DEBUG_FORMAT = "png"
+DEBUG_COMPRESS_LEVEL = 1
+DISTORTION_CACHE_MB = 256
+CACHE_DIR = ""
+GEOMETRY_ENGINE = "fused"
+ENGINE = "pil"
+FULL_SEQUENCE = False
+PREVIEW = 0.0
+OPEN_PREVIEW = None
+PROFILE = ""
+MAX_MEMORY = 0
+THREADS = 0
+RENDER_CACHE_MB = 4096
+FRAME_CACHE_MB = 4096
+NO_CACHE = False
+ENCODER_PROFILE = "default"
+ENCODER_THREADS = 0
 
 
 # variable that cannot be changed by arg-parser
 _OUTPUT_VIDEO_TYPE = ".mp4"
 _OUTPUT_VIDEO_CODEC = "h264"
+_DISTORTION_ENGINES = ["mesh", "remap", "remap_bicubic"]
+_BLUR_ENGINES = ["gaussian", "pyramid"]
+_FRAME_TRANSPORTS = ["shared_memory", "pickle"]
+_DEBUG_FORMATS = ["png", "bmp"]
+_GEOMETRY_ENGINES = ["chain", "fused", "fused_bicubic"]
+_ENGINES = ["pil", "ffmpeg"]
+_COPYABLE_CODECS = ["h264", "hevc"]
+_PREVIEW_ENCODER_ARGS = ["-vcodec", _OUTPUT_VIDEO_CODEC, "-preset", "ultrafast", "-crf", "35"]
+# output arguments of the transition encoders: 'default' leaves everything to ffmpeg, 'fast_intermediate' is made for
+# editing (quick to encode, intra frames only), 'delivery' for the final video, 'lossless' keeps the exact RGB frames
+_ENCODER_PROFILES = {"default": ["-vcodec", _OUTPUT_VIDEO_CODEC],
+                     "fast_intermediate": ["-vcodec", _OUTPUT_VIDEO_CODEC, "-preset", "ultrafast", "-g", "1",
+                                           "-crf", "16", "-pix_fmt", "yuv420p"],
+                     "delivery": ["-vcodec", _OUTPUT_VIDEO_CODEC, "-preset", "slow", "-crf", "18", "-pix_fmt",
+                                  "yuv420p", "-movflags", "+faststart"],
+                     "lossless": ["-vcodec", "libx264rgb", "-preset", "veryfast", "-qp", "0"]}
+_PREVIEW_SHEET_COLUMNS = 10
+# peak memory of the rendering of one frame, in number of frames of the input size (measured worst case over the
+# animations, the 'chain' engine zooms and rotates the whole mirror canvas)
+_FRAME_WORKING_SET = {"chain": 56, "fused": 16, "fused_bicubic": 16}
+# memory of the script itself and of the modules it loads (bytes)
+_BASE_MEMORY = 64 * 2 ** 20
+# memory of an ffmpeg h264 encoder (default settings) per pixel of the frames, measured at 1080p
+_ENCODER_BYTES_PER_PIXEL = 200
+# frames with fewer pixels are not split into bands (the threads would cost more than they save)
+_TILED_MIN_PIXELS = 1280 * 720
+# relative difference between the average and the base frame rates of a video above which it has a variable frame rate
+_VFR_TOLERANCE = 0.01
+# size budget of the lens distortion geometry saved into the cache folder (bytes)
+_DISTORTION_DISK_CACHE_BYTES = 1024 * 2 ** 20
+# part of the render cache keys, to be increased when a change of the rendering gives different frames
+_RENDER_CACHE_VERSION = 1
 _LIMITS = {"rotation": (5, 90), "brightness": (0.0, 2.0), "blur": (0.005, 1.0),
            "distortion": (0.3, 1.0), "zoom": (1.2, 2.0)}
 _ANIMATION_HELP = f"""  
@@ -94,6 +170,79 @@ def end_print(in_art):
         log_info(end)
 
 
+def prefetch(in_iterable, in_max_items):
+    """iterates over 'in_iterable' in a background thread, at most 'in_max_items' items are waiting to be consumed.
+    Exceptions raised by the iteration are raised again in the consumer"""
+    items = queue.Queue(maxsize=max(1, in_max_items))
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in in_iterable:
+                if not put((item, None)):
+                    return
+        except Exception as error:
+            put((end, error))
+            return
+        put((end, None))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def file_identity(in_path):
+    """hash of the path, size and modification time of a file, the data cached about it is not used anymore as soon
+    as it changes"""
+    stat = in_path.stat()
+    return hashlib.sha1(f"{in_path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf8")).hexdigest()
+
+
+def evict_least_recently_used(in_folder, in_max_bytes, in_name):
+    """removes the least recently used entries (files or folders, their modification time being their last use) of a
+    cache folder until it is within 'in_max_bytes'. The entries being written ('.tmp') are left alone"""
+    if not in_folder.is_dir():
+        return
+    entries = []
+    for entry in in_folder.iterdir():
+        if entry.suffix == ".tmp":
+            continue
+        try:
+            size = sum(f.stat().st_size for f in entry.iterdir()) if entry.is_dir() else entry.stat().st_size
+            entries.append((entry.stat().st_mtime, size, entry))
+        except OSError:
+            # removed meanwhile by another process
+            continue
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= in_max_bytes:
+            break
+        if entry.is_dir():
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            entry.unlink(missing_ok=True)
+        total -= size
+        log_debug(f"{in_name} removed from the cache: {entry.name} ({size / 2 ** 20:.1f} MB)")
+
+
 def progress(count, total, status=''):
     bar_len = 40
     end_char = ''
@@ -456,7 +605,421 @@ class AnimationActions:
         frame_action.function = FramesActions.Function.polynomial_inv
 
 
+class RenderOptions:
+    """rendering choices shared by all the frames, they are sent along with each frame to the rendering processes"""
+    def __init__(self, distortion_engine=DISTORTION_ENGINE, distortion_cache_mb=DISTORTION_CACHE_MB, cache_dir=None,
+                 geometry_engine=None, threads=THREADS, blur_engine=BLUR_ENGINE, frame_transport=FRAME_TRANSPORT,
+                 debug_format=DEBUG_FORMAT, debug_compress_level=DEBUG_COMPRESS_LEVEL):
+        self.distortion_engine = distortion_engine
+        # same default as the command line, the fused engines need numpy
+        if geometry_engine is None:
+            geometry_engine = GEOMETRY_ENGINE if np is not None else "chain"
+        self.geometry_engine = geometry_engine
+        self.distortion_cache_mb = distortion_cache_mb
+        self.cache_dir = cache_dir
+        # threads used inside each rendering process to compute the expensive effects by bands of rows (0 means all
+        # the CPU cores)
+        self.threads = threads if threads > 0 else max(1, os.cpu_count() or 1)
+        self.blur_engine = blur_engine
+        # how the frames are exchanged with the rendering processes ('shared_memory' or 'pickle')
+        self.frame_transport = frame_transport
+        # file format of the intermediate images saved in debug mode, and zlib level if it is 'png'
+        self.debug_format = debug_format
+        self.debug_compress_level = debug_compress_level
+
+
+class FrameResult:
+    """what the rendering of one frame sends back to the main process"""
+    def __init__(self, img, log_lines, distortion_info=None):
+        self.img = img
+        self.log_lines = log_lines
+        self.distortion_info = distortion_info
+        self.cache_stats = collections.Counter()
+        # seconds spent in each action of the frame
+        self.action_times = collections.Counter()
+
+
+class FramePlan:
+    """compiled actions of one frame: no-ops are skipped, consecutive point operations are merged into one lookup
+    table, and a frame identical to the previous one reuses its result"""
+    RUN = "run"
+    SKIP = "skip"
+    MERGED = "merged"
+    # value of the actions that give back the same frame (bit for bit), the geometric ones only when they are not part
+    # of a fused geometry run
+    _IDENTITY_VALUES = {FramesActions.Type.brightness: 1.0, FramesActions.Type.blur: 0.0,
+                        FramesActions.Type.zoom: 1.0, FramesActions.Type.rotation: 0.0}
+    _POINT_ACTIONS = [FramesActions.Type.brightness]
+
+    def __init__(self, steps):
+        # RUN, SKIP, MERGED (done by the lookup table of a previous step) or a lookup table (list of 768 values)
+        self.steps = steps
+        self.reuse_previous = False
+
+    @classmethod
+    def compile(cls, frame_actions, geometry_engine):
+        num_fused = 0
+        if geometry_engine != "chain":
+            num_fused = AnimationImages.count_fusable_actions(frame_actions)
+        steps = [cls.RUN] * len(frame_actions)
+        point_run = []
+        for action_idx, (action_type, value) in enumerate(frame_actions):
+            if action_idx < num_fused:
+                continue
+            if cls._IDENTITY_VALUES.get(action_type) == value:
+                # a no-op does not end the point operations run around it
+                steps[action_idx] = cls.SKIP
+                continue
+            if action_type in cls._POINT_ACTIONS:
+                point_run.append(action_idx)
+                continue
+            cls._merge_point_run(steps, frame_actions, point_run)
+            point_run = []
+        cls._merge_point_run(steps, frame_actions, point_run)
+        return cls(steps)
+
+    @staticmethod
+    def _merge_point_run(steps, frame_actions, point_run):
+        """the first action of the run gets the lookup table of the whole run"""
+        if len(point_run) == 0:
+            return
+        steps[point_run[0]] = FramePlan.lookup_table([frame_actions[idx] for idx in point_run])
+        for action_idx in point_run[1:]:
+            steps[action_idx] = FramePlan.MERGED
+
+    @staticmethod
+    def lookup_table(point_actions):
+        """the point actions applied to a ramp of all the channel values (exact for any frame)"""
+        ramp = Image.frombytes("RGB", (256, 1), bytes(value for value in range(256) for _ in range(3)))
+        for action_type, value in point_actions:
+            if action_type == FramesActions.Type.brightness:
+                ramp = AnimationImages.brightness_effect(ramp, value)
+        return [value for channel in ramp.split() for value in channel.getdata()]
+
+    def num_eliminated(self):
+        """number of actions whose pass over the frame is not done"""
+        if self.reuse_previous:
+            return len(self.steps)
+        return sum(1 for step in self.steps if step in (self.SKIP, self.MERGED))
+
+
+class Profiler:
+    """wall time spent in each stage of the script, and time spent in each frame action (summed over all the frames,
+    whichever process rendered them), along with the peak memory of the script and of its child processes"""
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        # name -> [seconds, count]
+        self.stages = {}
+        self.actions = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, in_name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(in_name, time.perf_counter() - start)
+
+    def add_stage(self, in_name, in_seconds, in_count=1):
+        self._add(self.stages, in_name, in_seconds, in_count)
+
+    def add_actions(self, in_action_times):
+        for name, seconds in in_action_times.items():
+            self._add(self.actions, name, seconds, 1)
+
+    def _add(self, in_entries, in_name, in_seconds, in_count):
+        with self.lock:
+            entry = in_entries.setdefault(in_name, [0.0, 0])
+            entry[0] += in_seconds
+            entry[1] += in_count
+
+    @staticmethod
+    def peak_memory():
+        """peak resident set size (bytes) of this process and of its largest finished child process (ffmpeg or
+        rendering process), None if it cannot be measured on this platform"""
+        if resource is None:
+            return None
+        # 'ru_maxrss' is in bytes on macOS and in kilobytes elsewhere
+        unit = 1 if sys.platform == "darwin" else 1024
+        return {"self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+                "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit}
+
+    def report(self, in_run_info=None):
+        total = time.perf_counter() - self.start_time
+
+        def entries(in_entries):
+            return [{"name": name, "seconds": round(seconds, 6), "count": count,
+                     "mean_ms": round(1000 * seconds / max(count, 1), 3), "share": round(seconds / total, 4)}
+                    for name, (seconds, count) in in_entries.items()]
+        return {"run": in_run_info or {}, "total_seconds": round(total, 6), "stages": entries(self.stages),
+                "actions": entries(self.actions), "peak_rss_bytes": self.peak_memory()}
+
+    @staticmethod
+    def format_table(in_report):
+        lines = [f"{'stage / action':<32s}{'total (s)':>11s}{'count':>8s}{'mean (ms)':>11s}{'share':>8s}"]
+        for title, key in [("stages (wall time)", "stages"), ("frame actions (summed over processes)", "actions")]:
+            if len(in_report[key]) == 0:
+                continue
+            lines.append(f"-- {title} ".ljust(70, "-"))
+            for entry in in_report[key]:
+                lines.append(f"{entry['name']:<32s}{entry['seconds']:>11.3f}{entry['count']:>8d}"
+                             f"{entry['mean_ms']:>11.2f}{entry['share']:>8.1%}")
+        lines.append(f"{'total':<32s}{in_report['total_seconds']:>11.3f}")
+        if in_report["peak_rss_bytes"] is not None:
+            lines.append(f"peak memory (RSS): script [{in_report['peak_rss_bytes']['self'] / 2 ** 20:.1f} MB], "
+                         f"largest child process [{in_report['peak_rss_bytes']['children'] / 2 ** 20:.1f} MB]")
+        return lines
+
+
+class SharedFrames:
+    """ring of shared memory slots exchanging the frames with the rendering processes without pickling them, the
+    worker renders the frame of a slot in place and writes the result back into it. Segments are only created and
+    unlinked by the main process"""
+    # segments attached by this (worker) process: name -> SharedMemory
+    _attached = collections.OrderedDict()
+    _MAX_ATTACHED = 64
+    # workers do not track the segments they attach (python 3.13+), before that they share the tracker of the main
+    # process, which then sees the segments registered once more but unlinked only once
+    _ATTACH_ARGS = {"track": False} if sys.version_info >= (3, 13) else {}
+    _SHM_FOLDER = pathlib.Path("/dev/shm")
+
+    class Slot:
+        def __init__(self, name, size):
+            self.name = name
+            self.size = size
+
+        def num_bytes(self):
+            return self.size[0] * self.size[1] * 3
+
+    def __init__(self, num_slots):
+        self.segments = [None] * num_slots
+        if os.name == "posix":
+            # the rendering processes forked from now on inherit the tracker instead of starting their own one, which
+            # would unlink the segments when they exit
+            resource_tracker.ensure_running()
+
+    def put(self, slot_idx, in_img):
+        """copies an image into a slot, returns the Slot to send, or None if the image cannot go through shared memory
+        (it is then pickled as usual)"""
+        slot = SharedFrames.Slot(None, in_img.size)
+        if in_img.mode != "RGB":
+            return None
+        segment = self.segments[slot_idx]
+        if segment is None or segment.size < slot.num_bytes():
+            # tmpfs is filled lazily, writing to a segment larger than the free space would crash the process
+            if self._SHM_FOLDER.is_dir() and shutil.disk_usage(self._SHM_FOLDER).free < 2 * slot.num_bytes():
+                return None
+            self._release(slot_idx)
+            segment = self.segments[slot_idx] = shared_memory.SharedMemory(create=True, size=slot.num_bytes())
+        segment.buf[:slot.num_bytes()] = in_img.tobytes()
+        slot.name = segment.name
+        return slot
+
+    def get(self, slot_idx, in_slot):
+        """copy of the rendered frame held by a slot, the slot can be reused afterwards"""
+        return Image.frombytes("RGB", in_slot.size, self.segments[slot_idx].buf[:in_slot.num_bytes()])
+
+    def close(self):
+        for slot_idx in range(len(self.segments)):
+            self._release(slot_idx)
+
+    def _release(self, slot_idx):
+        if self.segments[slot_idx] is not None:
+            self.segments[slot_idx].close()
+            self.segments[slot_idx].unlink()
+            self.segments[slot_idx] = None
+
+    @staticmethod
+    def _attach(in_name):
+        """segment of the main process, attached once per worker process"""
+        attached = SharedFrames._attached
+        if in_name in attached:
+            attached.move_to_end(in_name)
+            return attached[in_name]
+        segment = shared_memory.SharedMemory(name=in_name, **SharedFrames._ATTACH_ARGS)
+        attached[in_name] = segment
+        while len(attached) > SharedFrames._MAX_ATTACHED:
+            _, old_segment = attached.popitem(last=False)
+            with contextlib.suppress(BufferError):
+                old_segment.close()
+        return segment
+
+    @staticmethod
+    def view(in_slot):
+        """image reading the frame of a slot in place (no copy), it must not be used after the slot is written"""
+        buffer = SharedFrames._attach(in_slot.name).buf[:in_slot.num_bytes()]
+        return Image.frombuffer("RGB", in_slot.size, buffer, "raw", "RGB", 0, 1)
+
+    @staticmethod
+    def write(in_slot, in_img):
+        """writes a rendered frame into a slot, returns the Slot describing it, or the image itself if it does not fit
+        in the slot (it is then pickled as usual)"""
+        slot = SharedFrames.Slot(in_slot.name, in_img.size)
+        segment = SharedFrames._attach(in_slot.name)
+        if in_img.mode != "RGB" or segment.size < slot.num_bytes():
+            return in_img
+        segment.buf[:slot.num_bytes()] = in_img.tobytes()
+        return slot
+
+
+class DebugImageWriter:
+    """saves the intermediate images of the debug mode from background threads, so that the rendering does not wait for
+    their compression. The queue is bounded: if the disk cannot keep up, the rendering waits for it instead of holding
+    more images in memory. The threads stop when the queue is empty (they are started again by the next image), and
+    a process waits for them before exiting. Each process has its own instance"""
+    _instance = None
+
+    def __init__(self, num_threads=2, max_queued=16):
+        self.num_threads = num_threads
+        self.queue = queue.Queue(max_queued)
+        self.num_running = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls._instance = DebugImageWriter()
+        return cls._instance
+
+    def save(self, in_img, in_path, in_options):
+        """'in_path' is saved with the suffix of the debug format"""
+        in_path = in_path.with_suffix("." + in_options.debug_format)
+        params = {"compress_level": in_options.debug_compress_level} if in_options.debug_format == "png" else {}
+        self.queue.put((in_img, in_path, params))
+        with self.lock:
+            if self.num_running < self.num_threads:
+                self.num_running += 1
+                threading.Thread(target=self._write_images).start()
+
+    def _write_images(self):
+        while True:
+            with self.lock:
+                try:
+                    img, path, params = self.queue.get_nowait()
+                except queue.Empty:
+                    self.num_running -= 1
+                    return
+            try:
+                img.save(str(path), **params)
+            except OSError as e:
+                log_warning(f"could not save the debug image [{path}]: {e}")
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """waits until all the queued images are saved"""
+        self.queue.join()
+
+
+class DistortionCache:
+    """LRU cache of the lens distortion geometry (PIL meshes or NumPy remap tables) keyed by (image size, strength,
+    zoom), bounded by a memory budget. If a folder is given, the geometry is also saved to it, so that the next
+    transitions at the same resolution do not have to compute it again (the least recently used files are removed when
+    the folder is above its own size budget). Each process has its own instance"""
+    _instance = None
+
+    def __init__(self, max_bytes, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.entries = collections.OrderedDict()
+        self.used_bytes = 0
+        self.stats = collections.Counter()
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def for_options(cls, in_options):
+        max_bytes = in_options.distortion_cache_mb * 1024 ** 2
+        disk_dir = None if in_options.cache_dir is None else in_options.cache_dir / "distortion"
+        if cls._instance is None or cls._instance.max_bytes != max_bytes or cls._instance.disk_dir != disk_dir:
+            cls._instance = DistortionCache(max_bytes, disk_dir)
+        return cls._instance
+
+    @staticmethod
+    def make_key(kind, size, strength, zoom):
+        # rounding only removes the floating point noise of the values computed by the animation curves
+        return kind, size[0], size[1], round(strength, 9), round(zoom, 9)
+
+    def get(self, key, builder):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return self.entries[key]
+        self.stats["misses"] += 1
+        value = self._load(key)
+        if value is None:
+            value = builder()
+            self._save(key, value)
+        else:
+            self.stats["disk_loads"] += 1
+        self._insert(key, value)
+        return value
+
+    def _insert(self, key, value):
+        size = self._size_of(value)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = value
+        self.used_bytes += size
+        while self.used_bytes > self.max_bytes:
+            _, old_value = self.entries.popitem(last=False)
+            self.used_bytes -= self._size_of(old_value)
+            self.stats["evictions"] += 1
+
+    @staticmethod
+    def _size_of(value):
+        if isinstance(value, list):
+            return len(value) * 200  # a mesh item is a tuple of 2 tuples of 4 and 8 floats
+        return sum(arr.nbytes for arr in value)
+
+    def _file_path(self, key):
+        name = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+        # no pickle, the cache folder can be shared: meshes are saved as JSON, maps as a NumPy array
+        return self.disk_dir / f"{key[0]}_{key[1]}x{key[2]}_{name}{'.json' if key[0] == 'mesh' else '.npy'}"
+
+    def _load(self, key):
+        file_path = None if self.disk_dir is None else self._file_path(key)
+        if file_path is None or not file_path.is_file():
+            return None
+        try:
+            if key[0] == "mesh":
+                value = [(tuple(box), tuple(quad)) for box, quad in json.loads(file_path.read_text(encoding="utf8"))]
+            else:
+                maps = np.load(file_path, allow_pickle=False)
+                value = maps[0], maps[1]
+            # the modification time of a file is its last use
+            os.utime(file_path)
+            return value
+        except (OSError, ValueError, TypeError, EOFError, IndexError):
+            return None
+
+    def _save(self, key, value):
+        if self.disk_dir is None:
+            return
+        file_path = self._file_path(key)
+        tmp_path = file_path.with_name(file_path.name + f".{os.getpid()}.tmp")
+        try:
+            with tmp_path.open("wb") as f:
+                if key[0] == "mesh":
+                    f.write(json.dumps(value).encode("utf8"))
+                else:
+                    np.save(f, np.stack(value), allow_pickle=False)
+            os.replace(tmp_path, file_path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            return
+        evict_least_recently_used(self.disk_dir, _DISTORTION_DISK_CACHE_BYTES, "distortion geometry")
+
+
 class AnimationImages:
+    # size of the mirrored canvas (in frames) and position of the non flipped frame used as the reflection origin
+    _MIRROR_LAYOUTS = {FramesActions.MirrorDirection.all_directions_1: ((3, 3), (1, 1)),
+                       FramesActions.MirrorDirection.left_1: ((2, 1), (1, 0)),
+                       FramesActions.MirrorDirection.right_1: ((2, 1), (0, 0)),
+                       FramesActions.MirrorDirection.left_3: ((4, 1), (1, 0)),
+                       FramesActions.MirrorDirection.right_3: ((4, 1), (0, 0))}
+
     class PincushionDeformation:
         def __init__(self, strength=0.2, zoom=1.2, auto_zoom=False):
             self.correction_radius = None
@@ -529,70 +1092,371 @@ class AnimationImages:
             source_grid = [self.transform_rectangle(*rect) for rect in target_grid]
             return [t for t in zip(target_grid, source_grid)]
 
+        def getmap(self, img):
+            """vectorized version of 'transform' applied to every pixel center, it returns the source coordinates
+            (x and y maps of shape [h, w]) in the pixel index space, ready to be used by 'AnimationImages.remap'"""
+            self.determine_parameters(img)
+            width, height = img.size
+            new_x = (np.arange(width, dtype=np.float64) + 0.5 - self.half_width)[np.newaxis, :]
+            new_y = (np.arange(height, dtype=np.float64) + 0.5 - self.half_height)[:, np.newaxis]
+            r = np.sqrt(new_x ** 2 + new_y ** 2) / self.correction_radius
+            theta = np.ones_like(r)
+            np.divide(np.arctan(r), r, out=theta, where=r > 0)
+            source_x = self.half_width + theta * new_x * self.zoom - 0.5
+            source_y = self.half_height + theta * new_y * self.zoom - 0.5
+            return source_x.astype(np.float32), source_y.astype(np.float32)
+
+    class CachedMesh:
+        """deformer object (for 'ImageOps.deform') returning an already computed mesh"""
+        def __init__(self, mesh):
+            self.mesh = mesh
+
+        def getmesh(self, img):
+            return self.mesh
+
     @staticmethod
-    def make_transition(working_dir, in_images1, in_images2, in_actions1, in_actions2, debug=False):
+    def make_transition(working_dir, in_images1, in_images2, in_actions1, in_actions2, in_encoders, options=None,
+                        debug=False, jobs=1, executor=None, profiler=None, max_in_flight=None):
+        """images can be given as file paths (extracted to disk) or as PIL images (streamed from ffmpeg), each final
+        image is written to the encoder of its phase as soon as its actions are done. Frames are independent from each
+        other, so when 'jobs' > 1 they are rendered by a pool of processes (the output order is kept), 'executor' can
+        provide a pool shared by several transitions. The time spent in each action is added to 'profiler' if given.
+        Frames go through a streaming pipeline: images can be iterators (decoded while the transition is rendered), and
+        at most 'max_in_flight' frames (2 per process by default) are being rendered or waiting to be encoded"""
         log_info("")
         log_debug("".center(80, "="))
         log_info(" Transition image processing ".center(80, "="))
         log_debug("".center(80, "="))
-        images_path = [in_images1, in_images2]
-        res_folder = [None, None]
+        log_info(f"number of rendering processes: [{jobs}]")
+        if options is None:
+            options = RenderOptions()
+        log_debug(f"distortion engine: [{options.distortion_engine}], geometry engine: [{options.geometry_engine}], "
+                  f"blur engine: [{options.blur_engine}], threads per process: [{options.threads}]")
+        if max_in_flight is None:
+            max_in_flight = 2 * jobs
+        tasks = AnimationImages._frame_tasks(working_dir, [(in_images1, in_actions1), (in_images2, in_actions2)],
+                                             options, debug)
+
         peak_distortion_msg = []
         peak_distortion_value = 0.0
         peak_distortion_img = None
-        for phase_idx, actions in enumerate([in_actions1, in_actions2]):
-            log_debug("=" * 80)
-            log_info(f"processing transition phase_{phase_idx+1} images")
-            for img_idx, img_path in enumerate(images_path[phase_idx]):
+        cache_stats = collections.Counter()
+        plan_stats = collections.Counter()
+        own_executor = None
+        if executor is None and jobs > 1:
+            executor = own_executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        try:
+            for task, result in AnimationImages._render_frames(tasks, executor, max_in_flight, profiler):
+                phase_idx, img_idx, num_images = task[1], task[2], task[3]
+                if img_idx == 0:
+                    log_debug("=" * 80)
+                    log_info(f"processing transition phase_{phase_idx+1} images")
                 if not debug:
-                    progress(img_idx, len(images_path[phase_idx]), f"phase_{phase_idx+1} images")
-                img = Image.open(str(img_path))
-                original_size = img.size
-                log_debug(f" image [{img_idx+1}/{len(images_path[phase_idx])}] processing ".center(80, "-"))
-                log_debug(f"image path {img_path}")
-                for action_idx, action in enumerate(actions):
-                    suffix = action.action_type.name
-                    if action_idx == len(actions) - 1:
-                        suffix += "_final"
-                    img_save_folder = working_dir / f"{action_idx+2}_phase{phase_idx+1}_{suffix}"
-                    img_save_folder.mkdir(exist_ok=True)
-                    if action_idx == len(actions) - 1:
-                        res_folder[phase_idx] = img_save_folder
-                    value = action.values[img_idx]
-                    msg = f"phase_{phase_idx+1} - img [{img_idx+1}/{len(images_path[phase_idx])}]"
-                    if isinstance(value, tuple):
-                        msg += f" - action [{action.action_type.name} => ({value[0]:.1%}, {value[1]:.1%})]"
-                    else:
-                        msg += f" - action [{action.action_type.name} => {value:g}]"
-                    msg += f" - folder [{img_save_folder.name}]"
-                    log_debug(msg)
-                    if action.action_type == FramesActions.Type.mirror:
-                        img = AnimationImages.mirror_image_effect(img, value)
-                    elif action.action_type == FramesActions.Type.zoom:
-                        img = AnimationImages.zoom_effect(img, value)
-                    elif action.action_type == FramesActions.Type.crop:
-                        img = AnimationImages.crop_effect(img, value, original_size)
-                    elif action.action_type == FramesActions.Type.rotation:
-                        img = AnimationImages.rotation_effect(img, value)
-                    elif action.action_type == FramesActions.Type.blur:
-                        img = AnimationImages.blur_effect(img, value)
-                    elif action.action_type == FramesActions.Type.distortion:
-                        img = AnimationImages.distortion_effect(img, value)
-                        if value > peak_distortion_value:
-                            peak_distortion_msg = AnimationImages.PincushionDeformation(value, 1.0).get_debug_info(img)
-                            peak_distortion_value = value
-                            peak_distortion_img = img_path
-                    elif action.action_type == FramesActions.Type.brightness:
-                        img = AnimationImages.brightness_effect(img, value)
-                    if debug or action_idx == len(actions) - 1:
-                        img.save(str(img_save_folder / img_path.name))
-
-                log_debug("")
+                    progress(img_idx, num_images, f"phase_{phase_idx+1} images")
+                for line in result.log_lines:
+                    log_debug(line)
+                if result.distortion_info is not None and result.distortion_info[0] > peak_distortion_value:
+                    peak_distortion_value, peak_distortion_img, peak_distortion_msg = result.distortion_info
+                cache_stats.update(result.cache_stats)
+                frame_plan = task[6]
+                plan_stats["actions"] += len(frame_plan.steps)
+                plan_stats["eliminated"] += frame_plan.num_eliminated()
+                plan_stats["reused"] += frame_plan.reuse_previous
+                if profiler is None:
+                    in_encoders[phase_idx].write_frame(result.img)
+                    continue
+                profiler.add_actions(result.action_times)
+                with profiler.stage("rendering: frames writing"):
+                    in_encoders[phase_idx].write_frame(result.img)
+        finally:
+            if own_executor is not None:
+                own_executor.shutdown(cancel_futures=True)
+            if debug:
+                # the images of the frames rendered by this process (those of the worker processes are saved before
+                # the processes exit)
+                DebugImageWriter.get().flush()
+        log_debug(f"action plans: [{plan_stats['eliminated']}/{plan_stats['actions']}] operations eliminated "
+                  f"(no-ops and merged point operations), frames reused from the previous one: "
+                  f"[{plan_stats['reused']}]")
+        if cache_stats["hits"] + cache_stats["misses"] > 0:
+            log_debug(f"distortion geometry cache: hits [{cache_stats['hits']}], misses [{cache_stats['misses']}], "
+                      f"loaded from disk [{cache_stats['disk_loads']}], evictions [{cache_stats['evictions']}]")
         if peak_distortion_img is not None:
             log_debug(f"peak distortion effect: value [{peak_distortion_value}:.1%], img path: [{peak_distortion_img}]")
             for line in peak_distortion_msg:
                 log_debug(line)
-        return res_folder
+
+    @staticmethod
+    def _frame_tasks(working_dir, in_phases, options, debug):
+        """generator of the rendering tasks, the images of each phase (list or iterator) are only consumed as the tasks
+        are requested. The actions of each frame are compiled into a 'FramePlan'"""
+        for phase_idx, (images, actions) in enumerate(in_phases):
+            num_images = len(actions[0].values)
+            previous = None
+            for img_idx, img in zip(range(num_images), images):
+                frame_actions = [(action.action_type, action.values[img_idx]) for action in actions]
+                frame_plan = FramePlan.compile(frame_actions, options.geometry_engine)
+                # the images are only compared when the actions are the same (which is rare), it stays cheap
+                if previous is not None and previous[1] == frame_actions and \
+                        AnimationImages._same_image(previous[0], img):
+                    frame_plan.reuse_previous = True
+                previous = (img, frame_actions)
+                yield working_dir, phase_idx, img_idx, num_images, img, frame_actions, frame_plan, options, debug
+
+    @staticmethod
+    def _same_image(in_img1, in_img2):
+        """images are PIL images or paths of extracted images"""
+        if isinstance(in_img1, Image.Image) and isinstance(in_img2, Image.Image):
+            return in_img1.size == in_img2.size and in_img1.mode == in_img2.mode and \
+                in_img1.tobytes() == in_img2.tobytes()
+        if isinstance(in_img1, pathlib.Path) and isinstance(in_img2, pathlib.Path):
+            with Image.open(str(in_img1)) as img1, Image.open(str(in_img2)) as img2:
+                return AnimationImages._same_image(img1.convert("RGB"), img2.convert("RGB"))
+        return False
+
+    @staticmethod
+    def _reused_result(in_task, in_result):
+        """result of a frame identical to the previous one: its image is sent again, nothing is rendered"""
+        phase_idx, img_idx, num_images = in_task[1], in_task[2], in_task[3]
+        log_lines = [f" image [{img_idx+1}/{num_images}] processing ".center(80, "-"),
+                     f"phase_{phase_idx+1} - img [{img_idx+1}/{num_images}] - same source image and actions as the "
+                     f"previous frame, its result is reused", ""]
+        return FrameResult(in_result.img, log_lines)
+
+    @staticmethod
+    def _render_frames(in_tasks, executor, max_in_flight, profiler=None):
+        """generator of (task, rendered frame) in the order of the tasks. With an executor, at most 'max_in_flight'
+        tasks are submitted ahead of the one being consumed, and the in-memory frames go through a 'SharedFrames' ring
+        (unless the 'pickle' frame transport is chosen), the time spent copying them is added to 'profiler' if given"""
+        previous_result = None
+        if executor is None:
+            for task in in_tasks:
+                if task[6].reuse_previous:
+                    yield task, AnimationImages._reused_result(task, previous_result)
+                    continue
+                previous_result = AnimationImages.render_frame(task)
+                yield task, previous_result
+            return
+        max_in_flight = max(1, max_in_flight)
+        ring = SharedFrames(max_in_flight)
+        pending = collections.deque()
+
+        def submit(in_task, in_idx):
+            slot_idx = in_idx % max_in_flight
+            img, frame_plan, options = in_task[4], in_task[6], in_task[7]
+            if frame_plan.reuse_previous:
+                pending.append((in_task, slot_idx, None))
+                return
+            slot = None
+            if isinstance(img, Image.Image) and options.frame_transport == "shared_memory":
+                start = time.perf_counter()
+                slot = ring.put(slot_idx, img)
+                if profiler is not None and slot is not None:
+                    profiler.add_stage("ipc: frames to shared memory", time.perf_counter() - start)
+            sent_task = in_task if slot is None else in_task[:4] + (slot,) + in_task[5:]
+            pending.append((in_task, slot_idx, executor.submit(AnimationImages.render_frame, sent_task)))
+
+        def collect():
+            nonlocal previous_result
+            in_task, slot_idx, future = pending.popleft()
+            if future is None:
+                return in_task, AnimationImages._reused_result(in_task, previous_result)
+            result = previous_result = future.result()
+            if isinstance(result.img, SharedFrames.Slot):
+                start = time.perf_counter()
+                result.img = ring.get(slot_idx, result.img)
+                if profiler is not None:
+                    profiler.add_stage("ipc: frames from shared memory", time.perf_counter() - start)
+            return in_task, result
+
+        try:
+            for task_idx, task in enumerate(in_tasks):
+                submit(task, task_idx)
+                if len(pending) >= max_in_flight:
+                    yield collect()
+            while len(pending) > 0:
+                yield collect()
+        finally:
+            # the frames still being rendered must not write into the segments once they are unlinked
+            futures = [future for _, _, future in pending if future is not None]
+            for future in futures:
+                future.cancel()
+            concurrent.futures.wait(futures)
+            ring.close()
+
+    @staticmethod
+    def render_frame(in_task):
+        """applies the actions chain to one frame. It can run in a worker process, so debug messages are returned to
+        the caller instead of being logged, alongside the frame peak distortion info (value, image, debug info)"""
+        working_dir, phase_idx, img_idx, num_images, img_path, frame_actions, frame_plan, options, debug = in_task
+        img_name = f"{img_idx + 1:04d}.png"
+        slot = None
+        if isinstance(img_path, SharedFrames.Slot):
+            slot = img_path
+            img_path = SharedFrames.view(slot)
+        if isinstance(img_path, Image.Image):
+            img = img_path
+            img_path = f"phase_{phase_idx+1} in-memory frame [{img_name}]"
+        else:
+            img = Image.open(str(img_path))
+            img_name = img_path.name
+        original_size = img.size
+        log_lines = [f" image [{img_idx+1}/{num_images}] processing ".center(80, "-"), f"image path {img_path}"]
+        distortion_info = None
+        distortion_cache = DistortionCache.for_options(options)
+        cache_stats_before = distortion_cache.stats.copy()
+        num_fused = 0
+        action_times = collections.Counter()
+        if options.geometry_engine != "chain":
+            num_fused = AnimationImages.count_fusable_actions(frame_actions)
+        for action_idx, (action_type, value) in enumerate(frame_actions):
+            suffix = action_type.name
+            if action_idx == len(frame_actions) - 1:
+                suffix += "_final"
+            img_save_folder = working_dir / f"{action_idx+2}_phase{phase_idx+1}_{suffix}"
+            fused = action_idx < num_fused
+            img_computed = not fused or action_idx == num_fused - 1
+            if debug and img_computed:
+                img_save_folder.mkdir(exist_ok=True)
+            msg = f"phase_{phase_idx+1} - img [{img_idx+1}/{num_images}]"
+            if isinstance(value, tuple):
+                msg += f" - action [{action_type.name} => ({value[0]:.1%}, {value[1]:.1%})]"
+            else:
+                msg += f" - action [{action_type.name} => {value:g}]"
+            step = frame_plan.steps[action_idx]
+            if fused:
+                msg += " - fused geometry"
+            elif step == FramePlan.SKIP:
+                msg += " - no-op, skipped"
+            elif step == FramePlan.MERGED:
+                msg += " - merged into the previous lookup table"
+            elif step != FramePlan.RUN:
+                msg += " - lookup table"
+            if debug and img_computed:
+                msg += f" - folder [{img_save_folder.name}]"
+            log_lines.append(msg)
+            start = time.perf_counter()
+            if step in (FramePlan.SKIP, FramePlan.MERGED):
+                pass
+            elif step != FramePlan.RUN:
+                img = img.point(step)
+            elif fused:
+                if img_computed:
+                    resample = "bicubic" if options.geometry_engine == "fused_bicubic" else "bilinear"
+                    img = AnimationImages.fused_geometry_effect(img, frame_actions[:num_fused], resample,
+                                                                options.threads)
+            elif action_type == FramesActions.Type.mirror:
+                img = AnimationImages.mirror_image_effect(img, value)
+            elif action_type == FramesActions.Type.zoom:
+                img = AnimationImages.zoom_effect(img, value)
+            elif action_type == FramesActions.Type.crop:
+                img = AnimationImages.crop_effect(img, value, original_size)
+            elif action_type == FramesActions.Type.rotation:
+                img = AnimationImages.rotation_effect(img, value)
+            elif action_type == FramesActions.Type.blur:
+                img = AnimationImages.blur_effect(img, value, options.threads, options.blur_engine)
+            elif action_type == FramesActions.Type.distortion:
+                img = AnimationImages.distortion_effect(img, value, options.distortion_engine, distortion_cache,
+                                                        options.threads)
+                if distortion_info is None or value > distortion_info[0]:
+                    distortion_info = (value, img_path,
+                                       AnimationImages.PincushionDeformation(value, 1.0).get_debug_info(img))
+            elif action_type == FramesActions.Type.brightness:
+                img = AnimationImages.brightness_effect(img, value)
+            # a lookup table is counted as the type of the first action it merges
+            if step not in (FramePlan.SKIP, FramePlan.MERGED):
+                action_times["fused geometry" if fused else action_type.name] += time.perf_counter() - start
+            if debug and img_computed:
+                DebugImageWriter.get().save(img, img_save_folder / img_name, options)
+        log_lines.append("")
+        if slot is not None:
+            start = time.perf_counter()
+            img = SharedFrames.write(slot, img)
+            action_times["ipc: result to shared memory"] += time.perf_counter() - start
+        result = FrameResult(img, log_lines, distortion_info)
+        result.cache_stats = distortion_cache.stats - cache_stats_before
+        result.action_times = action_times
+        return result
+
+    @staticmethod
+    def count_fusable_actions(frame_actions):
+        """number of leading geometric actions (mirror, then zoom/rotation/crop) that 'fused_geometry_effect' can apply
+        at once, the run is only worth fusing if it is cropped back to the frame size"""
+        if len(frame_actions) == 0 or frame_actions[0][0] != FramesActions.Type.mirror or \
+                frame_actions[0][1] not in AnimationImages._MIRROR_LAYOUTS:
+            return 0
+        num_fusable = 1
+        geometric_types = [FramesActions.Type.zoom, FramesActions.Type.rotation, FramesActions.Type.crop]
+        while num_fusable < len(frame_actions) and frame_actions[num_fusable][0] in geometric_types:
+            num_fusable += 1
+        has_crop = any(action_type == FramesActions.Type.crop for action_type, _ in frame_actions[:num_fusable])
+        return num_fusable if has_crop else 0
+
+    @staticmethod
+    def fused_geometry_effect(in_img, geometry_actions, resample="bilinear", threads=1):
+        """same result as applying the mirror -> zoom/rotation -> crop actions one after the other, but with a single
+        resampling of the output pixels only: the inverses of the actions are composed into one affine map from the
+        output to the mirrored canvas, which is never built (its pixels are found by reflecting the coordinates back
+        into the original frame)"""
+        w, h = in_img.size
+        (tiles_x, tiles_y), (origin_x, origin_y) = AnimationImages._MIRROR_LAYOUTS[geometry_actions[0][1]]
+        out_w, out_h = tiles_x * w, tiles_y * h
+        matrix = np.identity(3)  # output pixel coordinates -> mirrored canvas coordinates
+        for action_type, value in geometry_actions[1:]:
+            cx, cy = out_w / 2, out_h / 2
+            if action_type == FramesActions.Type.zoom:
+                step = [[1 / value, 0, cx - cx / value], [0, 1 / value, cy - cy / value], [0, 0, 1]]
+            elif action_type == FramesActions.Type.rotation:
+                # same matrix as 'Image.rotate'
+                angle = -math.radians(value)
+                cos_a, sin_a = round(math.cos(angle), 15), round(math.sin(angle), 15)
+                step = [[cos_a, sin_a, cx - cos_a * cx - sin_a * cy], [-sin_a, cos_a, cy + sin_a * cx - cos_a * cy],
+                        [0, 0, 1]]
+            else:
+                step = [[1, 0, int(round(value[0] * w, 0))], [0, 1, int(round(value[1] * h, 0))], [0, 0, 1]]
+                out_w, out_h = w, h
+            matrix = matrix @ np.array(step, dtype=np.float64)
+        offset_x, offset_y = matrix[0, 2] - origin_x * w, matrix[1, 2] - origin_y * h
+        if np.allclose(matrix[:2, :2], np.identity(2)) and offset_x.is_integer() and offset_y.is_integer():
+            # pure translation by whole pixels: the output is pasted from (flipped) pieces of the frame, no resampling
+            res = Image.new('RGB', (out_w, out_h))
+            for x0, seg_w, dst_x, flip_x in AnimationImages._reflect_segments(int(offset_x), out_w, w):
+                for y0, seg_h, dst_y, flip_y in AnimationImages._reflect_segments(int(offset_y), out_h, h):
+                    piece = in_img.crop((x0, y0, x0 + seg_w, y0 + seg_h))
+                    if flip_x:
+                        piece = piece.transpose(0)
+                    if flip_y:
+                        piece = piece.transpose(1)
+                    res.paste(piece, (dst_x, dst_y))
+            return res
+        px = (np.arange(out_w, dtype=np.float32) + 0.5)[np.newaxis, :]
+        py = (np.arange(out_h, dtype=np.float32) + 0.5)[:, np.newaxis]
+        m = matrix.astype(np.float32)
+        map_x = AnimationImages._reflect(m[0, 0] * px + m[0, 1] * py + np.float32(offset_x), w)
+        map_y = AnimationImages._reflect(m[1, 0] * px + m[1, 1] * py + np.float32(offset_y), h)
+        return AnimationImages.remap(in_img, map_x, map_y, resample, threads=threads)
+
+    @staticmethod
+    def _reflect(coords, length):
+        """mirror-reflect addressing: continuous coordinates of the mirrored canvas (relative to the position of the
+        original frame) to pixel indices in the original frame"""
+        coords = np.mod(coords, 2 * length)
+        return np.where(coords > length, 2 * length - coords, coords) - 0.5
+
+    @staticmethod
+    def _reflect_segments(offset, out_length, length):
+        """splits the pixels [offset, offset + out_length) of a mirror-reflected axis into segments of the original
+        frame: (start in the frame, segment length, start in the output, is flipped)"""
+        segments = []
+        covered = 0
+        while covered < out_length:
+            tile, pos = divmod(offset + covered, length)
+            seg_length = min(length - pos, out_length - covered)
+            flipped = tile % 2 == 1
+            start = length - pos - seg_length if flipped else pos
+            segments.append((start, seg_length, covered, flipped))
+            covered += seg_length
+        return segments
 
     @staticmethod
     def mirror_image_effect(in_img, mirror_direction):
@@ -643,14 +1507,182 @@ class AnimationImages:
         return in_img.rotate(rot_angle)
 
     @staticmethod
-    def blur_effect(in_img, blur_value):
+    def blur_effect(in_img, blur_value, threads=1, engine="gaussian"):
         blue_strength = min(in_img.size[0], in_img.size[1]) * blur_value * 0.1
         # print(blue_strength)
-        return in_img.filter(ImageFilter.GaussianBlur(blue_strength))
+        if engine == "pyramid":
+            return AnimationImages.pyramid_blur(in_img, blue_strength)
+        if not AnimationImages.use_bands(in_img, threads):
+            return in_img.filter(ImageFilter.GaussianBlur(blue_strength))
+        # the gaussian blur is made of 3 box blurs, each one reads at most 'strength + 2' rows around a pixel: the bands
+        # are blurred with enough rows around them to get exactly the same result as the whole frame
+        w, h = in_img.size
+        margin = 3 * (int(blue_strength) + 2)
+
+        def blur_band(y0, y1):
+            top, bottom = max(0, y0 - margin), min(h, y1 + margin)
+            band = in_img.crop((0, top, w, bottom)).filter(ImageFilter.GaussianBlur(blue_strength))
+            return band.crop((0, y0 - top, w, y1 - top))
+        return AnimationImages.by_bands(in_img.size, threads, blur_band)
 
     @staticmethod
-    def distortion_effect(in_img, distortion_strength):
-        return ImageOps.deform(in_img, AnimationImages.PincushionDeformation(distortion_strength, 1.0))
+    def pyramid_blur(in_img, strength, min_strength=2.0):
+        """approximation of the gaussian blur computed on a frame reduced by a power of 2 factor, chosen so that the
+        reduced blur strength stays above 'min_strength' pixels: its cost is about the same for any strength. The box
+        reduction and the bilinear enlargement blur as well (variance of f^2/12 and f^2/6), the strength of the reduced
+        blur is lowered to keep the total the same"""
+        w, h = in_img.size
+        factor = 1
+        while strength / (2 * factor) >= min_strength and w // (2 * factor) >= 8 and h // (2 * factor) >= 8:
+            factor *= 2
+        if factor == 1:
+            return in_img.filter(ImageFilter.GaussianBlur(strength))
+        reduced_strength = math.sqrt(max(strength ** 2 - factor ** 2 / 4, 0)) / factor
+        # like the gaussian blur, the frame is extended by repeating its border pixels (a reduced border pixel would be
+        # the average of several rows or columns)
+        margin = 3 * (int(reduced_strength) + 2)
+        small = AnimationImages._extend_border(in_img, margin * factor).reduce(factor)
+        small = small.filter(ImageFilter.GaussianBlur(reduced_strength))
+        return small.resize((w, h), Image.BILINEAR, box=(margin, margin, margin + w / factor, margin + h / factor))
+
+    @staticmethod
+    def _extend_border(in_img, border):
+        w, h = in_img.size
+        res = Image.new(in_img.mode, (w + 2 * border, h + 2 * border))
+        res.paste(in_img, (border, border))
+        res.paste(in_img.crop((0, 0, 1, h)).resize((border, h), Image.NEAREST), (0, border))
+        res.paste(in_img.crop((w - 1, 0, w, h)).resize((border, h), Image.NEAREST), (w + border, border))
+        res.paste(res.crop((0, border, w + 2 * border, border + 1)).resize((w + 2 * border, border), Image.NEAREST),
+                  (0, 0))
+        res.paste(res.crop((0, h + border - 1, w + 2 * border, h + border)).resize((w + 2 * border, border),
+                                                                                  Image.NEAREST), (0, h + border))
+        return res
+
+    @staticmethod
+    def distortion_effect(in_img, distortion_strength, engine="mesh", cache=None, threads=1):
+        kind = "mesh" if engine == "mesh" else "map"
+        if cache is not None:
+            key = DistortionCache.make_key(kind, in_img.size, distortion_strength, 1.0)
+            deformation = AnimationImages.PincushionDeformation(key[3], key[4])
+            geometry = cache.get(key, lambda: deformation.getmesh(in_img) if kind == "mesh" else
+                                 deformation.getmap(in_img))
+        else:
+            deformation = AnimationImages.PincushionDeformation(distortion_strength, 1.0)
+            geometry = deformation.getmesh(in_img) if kind == "mesh" else deformation.getmap(in_img)
+        if kind == "mesh":
+            if not AnimationImages.use_bands(in_img, threads):
+                return ImageOps.deform(in_img, AnimationImages.CachedMesh(geometry))
+            return AnimationImages.mesh_by_bands(in_img, geometry, threads)
+        map_x, map_y = geometry
+        resample = "bicubic" if engine == "remap_bicubic" else "bilinear"
+        return AnimationImages.remap(in_img, map_x, map_y, resample, threads=threads)
+
+    @staticmethod
+    def mesh_by_bands(in_img, mesh, threads):
+        """same result as 'ImageOps.deform' with the mesh, each band of rows keeps the mesh quads it overlaps (shifted
+        to the band position). The bands are aligned on the mesh grid, so that no quad is split"""
+        w = in_img.size[0]
+        grid_space = mesh[0][0][3] - mesh[0][0][1]
+
+        def deform_band(y0, y1):
+            band_mesh = [((x0, q_y0 - y0, x1, q_y1 - y0), quad) for (x0, q_y0, x1, q_y1), quad in mesh
+                         if q_y1 > y0 and q_y0 < y1]
+            return in_img.transform((w, y1 - y0), Image.MESH, band_mesh, Image.BILINEAR)
+        return AnimationImages.by_bands(in_img.size, threads, deform_band, grid_space)
+
+    _band_executor = None
+    _band_executor_key = None
+
+    @staticmethod
+    def use_bands(in_img, threads):
+        return threads > 1 and in_img.size[0] * in_img.size[1] >= _TILED_MIN_PIXELS
+
+    @staticmethod
+    def band_bounds(in_height, threads, align=1):
+        """limits of the bands of rows (2 per thread, to balance the work), multiple of 'align'"""
+        num_bands = max(1, min(2 * threads, in_height // max(align, 16)))
+        bounds = sorted({min(in_height, int(round(in_height * idx / num_bands / align)) * align)
+                         for idx in range(num_bands)} | {in_height})
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    @staticmethod
+    def band_map(threads, func, bands):
+        """calls func(y0, y1) on each band with a pool of threads, Pillow and NumPy release the GIL in their pixel
+        loops. The pool is created once per process (and again in a forked one)"""
+        key = (os.getpid(), threads)
+        if AnimationImages._band_executor_key != key:
+            AnimationImages._band_executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+            AnimationImages._band_executor_key = key
+        return list(AnimationImages._band_executor.map(lambda band: func(*band), bands))
+
+    @staticmethod
+    def by_bands(in_size, threads, func, align=1):
+        """image of size 'in_size' stitched from the bands of rows returned by func(y0, y1)"""
+        bands = AnimationImages.band_bounds(in_size[1], threads, align)
+        res = None
+        for (y0, _), band in zip(bands, AnimationImages.band_map(threads, func, bands)):
+            if res is None:
+                res = Image.new(band.mode, in_size)
+            res.paste(band, (0, y0))
+        return res
+
+    @staticmethod
+    def remap(in_img, map_x, map_y, resample="bilinear", band_height=64, threads=1):
+        """samples 'in_img' at the (float) pixel coordinates given by 'map_x' and 'map_y', coordinates outside of the
+        image are clamped to its border. The output is computed by bands of rows to keep the temporary arrays small,
+        the bands are shared by 'threads' threads for large frames"""
+        w, h = in_img.size
+        src = np.empty((h, w, 4), dtype=np.uint8)
+        src[..., :3] = np.asarray(in_img.convert("RGB"))
+        flat_src = src.view(np.uint32).ravel()  # one 32 bits gather per pixel instead of three 8 bits ones
+        out = np.empty(map_x.shape + (4,), dtype=np.uint8)
+
+        def remap_band(y0, y1):
+            band_x, band_y = map_x[y0:y1], map_y[y0:y1]
+            ix, iy = np.floor(band_x), np.floor(band_y)
+            fx, fy = (band_x - ix)[..., np.newaxis], (band_y - iy)[..., np.newaxis]
+            ix, iy = ix.astype(np.intp), iy.astype(np.intp)
+
+            def pixels(di, dj):
+                idx = np.clip(iy + dj, 0, h - 1) * w + np.clip(ix + di, 0, w - 1)
+                return flat_src.take(idx).view(np.uint8).reshape(band_x.shape + (4,))
+
+            if resample == "bicubic":
+                wx, wy = AnimationImages._cubic_weights(fx), AnimationImages._cubic_weights(fy)
+                res = np.zeros(band_x.shape + (4,), dtype=np.float32)
+                for j in range(4):
+                    for i in range(4):
+                        res += pixels(i - 1, j - 1) * (wx[i] * wy[j])
+                np.clip(res, 0, 255, out=res)
+            else:
+                p00, p10 = pixels(0, 0), pixels(0, 1)
+                top = np.subtract(pixels(1, 0), p00, dtype=np.float32)
+                top *= fx
+                top += p00
+                res = np.subtract(pixels(1, 1), p10, dtype=np.float32)
+                res *= fx
+                res += p10
+                res -= top
+                res *= fy
+                res += top
+            res += 0.5
+            out[y0:y1] = res
+
+        bands = [(y0, min(y0 + band_height, map_x.shape[0])) for y0 in range(0, map_x.shape[0], band_height)]
+        if threads > 1 and map_x.size >= _TILED_MIN_PIXELS:
+            AnimationImages.band_map(threads, remap_band, bands)
+        else:
+            for y0, y1 in bands:
+                remap_band(y0, y1)
+        return Image.fromarray(out[..., :3])
+
+    @staticmethod
+    def _cubic_weights(t, a=-0.5):
+        """Keys cubic convolution weights of the 4 neighbours (at offsets -1, 0, 1, 2) for fractional positions t"""
+        t = t.astype(np.float32)
+        d = [1 + t, t, 1 - t, 2 - t]
+        return [a * di ** 3 - 5 * a * di ** 2 + 8 * a * di - 4 * a if k in (0, 3) else
+                (a + 2) * di ** 3 - (a + 3) * di ** 2 + 1 for k, di in enumerate(d)]
 
     @staticmethod
     def brightness_effect(in_img, brightness_value):
@@ -658,6 +1690,506 @@ class AnimationImages:
         return enhancer.enhance(brightness_value)
 
 
+def render_transition(frames_a, frames_b, animation=ANIMATION, num_frames=NUM_FRAMES, max_rotation=MAX_ROTATION,
+                      max_distortion=MAX_DISTORTION, max_blur=MAX_BLUR, max_brightness=MAX_BRIGHTNESS,
+                      max_zoom=MAX_ZOOM, options=None, jobs=1, executor=None):
+    """library entry point: renders the transition between two sequences of PIL images, and yields its frames in order
+    (the phase 1 frames, then the phase 2 ones). Nothing is read from or written to the disk, and nothing is probed
+    with ffmpeg, so a long running process keeps its caches (distortion geometry, thread pool) between transitions.
+
+    'frames_a' gives the end of the first video, only its last 'num_frames' images are used. 'frames_b' gives the
+    start of the second video, 'num_frames' images are used ('2 * num_frames' for the long translations), they are
+    consumed as the transition is rendered. 'animation' is the name of an animation (or an 'Animations' value), the
+    other parameters are the ones of the command line. With 'jobs' > 1 or an 'executor' (a pool of processes, which
+    can be shared by several transitions), frames are rendered in parallel. Before python 3.13, processes the executor
+    started before its first transition report the shared frames as leaked when they exit.
+
+    ValueError is raised if the animation is not recognized, or if there are not enough frames"""
+    if not isinstance(animation, Animations):
+        if animation.lower().strip() not in Animations.__members__:
+            raise ValueError(f"animation [{animation}] not recognized, possible values: {list(Animations.__members__)}")
+        animation = Animations[animation.lower().strip()]
+    if options is None:
+        # like the command line, the CPU cores are shared between the rendering processes
+        options = RenderOptions(threads=max(1, (os.cpu_count() or 1) // max(jobs, 1)))
+    actions = AnimationActions(max_zoom, max_brightness, max_rotation, max_blur, max_distortion, num_frames)
+    phase1_actions, phase2_actions = actions.get_actions_values(animation)
+    num_frames1, num_frames2 = len(phase1_actions[0].values), len(phase2_actions[0].values)
+    frames_a = collections.deque(frames_a, maxlen=num_frames1)
+    if len(frames_a) < num_frames1:
+        raise ValueError(f"[{num_frames1}] frames needed from the first video, [{len(frames_a)}] provided")
+    # the working folder is only used to save the intermediate images when debugging
+    tasks = AnimationImages._frame_tasks(pathlib.Path(), [(frames_a, phase1_actions), (frames_b, phase2_actions)],
+                                         options, False)
+    own_executor = None
+    if executor is None and jobs > 1:
+        executor = own_executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+    num_rendered = 0
+    try:
+        for _, result in AnimationImages._render_frames(tasks, executor, 2 * max(jobs, 1)):
+            num_rendered += 1
+            yield result.img
+    finally:
+        if own_executor is not None:
+            own_executor.shutdown(cancel_futures=True)
+    if num_rendered < num_frames1 + num_frames2:
+        raise ValueError(f"[{num_frames2}] frames needed from the second video, [{num_rendered - num_frames1}] "
+                         f"provided")
+
+
+class FFmpegPipe:
+    """ffmpeg process that streams raw RGB frames through its stdout (decoding) or its stdin (encoding), stderr is
+    drained in a background thread so that ffmpeg never blocks on a full pipe"""
+    def __init__(self, in_cmd, in_presentation, in_size, encode=False):
+        self.cmd = in_cmd
+        self.size = in_size
+        self.frame_bytes = in_size[0] * in_size[1] * 3
+        self.num_frames = 0
+        self.broken = False
+        log_debug("")
+        log_debug(in_presentation)
+        log_debug("")
+        log_debug(" ".join(in_cmd))
+        if encode:
+            self.proc = subprocess.Popen(in_cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.PIPE)
+        else:
+            self.proc = subprocess.Popen(in_cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE)
+        self.stderr_lines = []
+        self.stderr_thread = threading.Thread(target=lambda: self.stderr_lines.extend(self.proc.stderr), daemon=True)
+        self.stderr_thread.start()
+
+    def read_frame(self):
+        data = self.proc.stdout.read(self.frame_bytes)
+        if len(data) < self.frame_bytes:
+            return None
+        self.num_frames += 1
+        return Image.frombytes("RGB", self.size, data)
+
+    def write_frame(self, in_img):
+        if self.broken:
+            return
+        if in_img.size != self.size:
+            # frames of the second video going to the same encoder as the first one (merged output)
+            in_img = in_img.resize(self.size, Image.BICUBIC)
+        try:
+            self.proc.stdin.write(in_img.tobytes())
+            self.num_frames += 1
+        except (BrokenPipeError, OSError):
+            self.broken = True
+
+    def close(self):
+        for stream in [self.proc.stdin, self.proc.stdout]:
+            if stream is not None:
+                try:
+                    stream.close()
+                except (BrokenPipeError, OSError):
+                    self.broken = True
+        self.proc.wait()
+        self.stderr_thread.join()
+        self.proc.stderr.close()
+        log_debug("")
+        log_debug("stderr:")
+        log_debug("")
+        log_debug(b"".join(self.stderr_lines).decode(errors="replace"))
+        log_debug(f"number of streamed frames: [{self.num_frames}], return code: [{self.proc.returncode}]")
+        log_debug("")
+        return self.proc.returncode == 0 and not self.broken
+
+
+class PreviewWriter:
+    """forwards the frames to the encoder of the preview video, and keeps a thumbnail of each of them for the contact
+    sheet (a grid image of all the transition frames, row after row)"""
+    def __init__(self, in_encoder, in_sheet_path, in_thumbnail_width=240):
+        self.encoder = in_encoder
+        self.sheet_path = in_sheet_path
+        w, h = in_encoder.size
+        self.thumbnail_size = (min(w, in_thumbnail_width), max(1, round(h * min(w, in_thumbnail_width) / w)))
+        self.thumbnails = []
+
+    def write_frame(self, in_img):
+        self.encoder.write_frame(in_img)
+        self.thumbnails.append(in_img.resize(self.thumbnail_size, Image.BILINEAR))
+
+    def close(self):
+        success = self.encoder.close()
+        if len(self.thumbnails) == 0:
+            return success
+        columns = min(_PREVIEW_SHEET_COLUMNS, len(self.thumbnails))
+        rows = int(math.ceil(len(self.thumbnails) / columns))
+        w, h = self.thumbnail_size
+        sheet = Image.new("RGB", (columns * w, rows * h))
+        for idx, thumbnail in enumerate(self.thumbnails):
+            sheet.paste(thumbnail, ((idx % columns) * w, (idx // columns) * h))
+        sheet.save(str(self.sheet_path))
+        log_debug(f"contact sheet of [{len(self.thumbnails)}] frames ({columns}x{rows}) saved into: {self.sheet_path}")
+        return success
+
+
+class FFmpegFilterGraph:
+    """builds a single ffmpeg '-filter_complex' graph rendering the whole transition (the 'ffmpeg' engine), so that no
+    frame goes through Python. Each phase builds its mirrored canvas once, then its frames are split in runs sharing the
+    same action values, rendered by filters with constant options and concatenated back"""
+    def __init__(self, in_fps):
+        self.fps = in_fps
+
+    def build(self, in_phases, merge=False):
+        """'in_phases' is a list of (input label, trim filters, actions, frames size), returns the graph and its output
+        labels (one per phase, or a single one if merged)"""
+        graph = []
+        out_labels = []
+        for phase_idx, (in_label, trim, actions, size) in enumerate(in_phases):
+            out_labels.append(self._phase_graph(graph, in_label, trim, actions, size, f"p{phase_idx + 1}"))
+        if merge:
+            first_size = in_phases[0][3]
+            for idx in range(1, len(out_labels)):
+                if in_phases[idx][3] != first_size:
+                    graph.append(f"[{out_labels[idx]}]scale={first_size[0]}:{first_size[1]},setsar=1"
+                                 f"[{out_labels[idx]}s]")
+                    out_labels[idx] += "s"
+            graph.append("".join(f"[{label}]" for label in out_labels) + f"concat=n={len(out_labels)}:v=1:a=0[merged]")
+            out_labels = ["merged"]
+        return ";".join(graph), out_labels
+
+    def _phase_graph(self, graph, in_label, trim, actions, size, tag):
+        # rgb24 at both ends, so that ffmpeg converts the colors exactly as when the frames are piped to and from python
+        label = f"{tag}in"
+        graph.append(f"[{in_label}]{trim},setpts=N/({self.fps})/TB,format=rgb24[{label}]")
+        if len(actions) > 0 and actions[0].action_type == FramesActions.Type.mirror:
+            directions = actions[0].values
+            if any(v != directions[0] for v in directions):
+                raise ValueError("the mirror direction has to be the same for all the frames of a phase")
+            label = self._mirror_graph(graph, label, directions[0], tag)
+            actions = actions[1:]
+        # most options of the filters cannot change from a frame to the next (the commands and expressions that could
+        # do it are not available for all of them, nor consistent across ffmpeg versions)
+        runs = []
+        for frame_idx in range(len(actions[0].values) if len(actions) > 0 else 0):
+            filters = self._frame_filters(actions, frame_idx, size)
+            if len(runs) > 0 and runs[-1][2] == filters:
+                runs[-1][1] = frame_idx + 1
+            else:
+                runs.append([frame_idx, frame_idx + 1, filters])
+        out_label = f"{tag}out"
+        if len(runs) <= 1:
+            filters = runs[0][2] if len(runs) > 0 else []
+            graph.append(f"[{label}]{','.join(filters + ['format=rgb24'])}[{out_label}]")
+            return out_label
+        graph.append(f"[{label}]split={len(runs)}" + "".join(f"[{label}{i}]" for i in range(len(runs))))
+        for run_idx, (start, end, filters) in enumerate(runs):
+            graph.append(f"[{label}{run_idx}]trim=start_frame={start}:end_frame={end},setpts=PTS-STARTPTS," +
+                         ",".join(filters + ["null"]) + f"[{tag}run{run_idx}]")
+        graph.append("".join(f"[{tag}run{i}]" for i in range(len(runs))) +
+                     f"concat=n={len(runs)}:v=1:a=0,setpts=N/({self.fps})/TB,format=rgb24[{out_label}]")
+        return out_label
+
+    def _frame_filters(self, in_actions, frame_idx, size):
+        """filters doing the actions of a frame, in the same way as 'AnimationImages.render_frame'"""
+        w, h = size
+        filters = []
+        for action in in_actions:
+            value = action.values[frame_idx]
+            if action.action_type == FramesActions.Type.mirror:
+                raise ValueError("the mirror action has to be the first action of a phase")
+            elif action.action_type == FramesActions.Type.zoom and value != 1:
+                # the zoomed region is sent to the frame corners, with sub-pixel precision
+                x0, y0, x1, y1 = [f"{c}/2{sign}{c}/{2 * value:.9f}" for sign, c in
+                                  [("-", "W"), ("-", "H"), ("+", "W"), ("+", "H")]]
+                filters.append(f"perspective=x0={x0}:y0={y0}:x1={x1}:y1={y0}:x2={x0}:y2={y1}:x3={x1}:y3={y1}:"
+                               f"interpolation=cubic")
+            elif action.action_type == FramesActions.Type.rotation and value != 0:
+                # Image.rotate turns anti-clockwise, the rotate filter clockwise
+                filters.append(f"rotate=a={-value:.9f}*PI/180:ow=iw:oh=ih:c=black")
+            elif action.action_type == FramesActions.Type.crop:
+                filters.append(f"crop=w={w}:h={h}:x={int(round(value[0] * w, 0))}:y={int(round(value[1] * h, 0))}:"
+                               f"exact=1")
+            elif action.action_type == FramesActions.Type.brightness and value != 1:
+                filters.append(f"colorchannelmixer=rr={value:.6f}:gg={value:.6f}:bb={value:.6f}")
+            elif action.action_type == FramesActions.Type.blur and value > 0:
+                # the Pillow gaussian blur radius is its standard deviation
+                filters.append(f"gblur=sigma={min(size) * value * 0.1:.6f}")
+            elif action.action_type == FramesActions.Type.distortion and value > 0:
+                k1, k2 = self.lens_coefficients(value, size)
+                filters.append(f"lenscorrection=k1={k1:.6f}:k2={k2:.6f}:i=bilinear")
+        return filters
+
+    @staticmethod
+    def _mirror_graph(graph, in_label, mirror_direction, tag):
+        """builds the mirrored canvas of 'AnimationImages.mirror_image_effect' with flips and stacks"""
+        # tile index: 0 original, 1 horizontal flip, 2 vertical flip, 3 both flips
+        flips = ["null", "hflip", "vflip", "hflip,vflip"]
+        if mirror_direction == FramesActions.MirrorDirection.all_directions_1:
+            rows = [[3, 2, 3], [1, 0, 1], [3, 2, 3]]
+        elif mirror_direction == FramesActions.MirrorDirection.left_1:
+            rows = [[1, 0]]
+        elif mirror_direction == FramesActions.MirrorDirection.right_1:
+            rows = [[0, 1]]
+        elif mirror_direction == FramesActions.MirrorDirection.left_3:
+            rows = [[1, 0, 1, 0]]
+        else:
+            rows = [[0, 1, 0, 1]]
+        tiles = [idx for row in rows for idx in row]
+        split_labels = [f"{tag}t{i}" for i in range(len(tiles))]
+        graph.append(f"[{in_label}]split={len(tiles)}" + "".join(f"[{lb}]" for lb in split_labels))
+        for lb, idx in zip(split_labels, tiles):
+            graph.append(f"[{lb}]{flips[idx]}[{lb}f]")
+        row_labels = []
+        for row_idx, row in enumerate(rows):
+            start = row_idx * len(row)
+            row_label = f"{tag}r{row_idx}"
+            graph.append("".join(f"[{lb}f]" for lb in split_labels[start:start + len(row)]) +
+                         f"hstack=inputs={len(row)}[{row_label}]")
+            row_labels.append(row_label)
+        if len(row_labels) == 1:
+            return row_labels[0]
+        canvas_label = f"{tag}canvas"
+        graph.append("".join(f"[{lb}]" for lb in row_labels) + f"vstack=inputs={len(row_labels)}[{canvas_label}]")
+        return canvas_label
+
+    @staticmethod
+    def lens_coefficients(in_strength, in_size):
+        """least squares fit of the 'PincushionDeformation' radial factor atan(r)/r by the polynomial model of the
+        lenscorrection filter (1 + k1 * p^2 + k2 * p^4, p being the distance to the center relative to the half
+        diagonal), the coefficients are limited to the filter range [-1, 1]"""
+        deformation = AnimationImages.PincushionDeformation(in_strength, 1.0)
+        deformation.determine_parameters(Image.new("RGB", in_size))
+        half_diagonal = math.sqrt(deformation.half_width ** 2 + deformation.half_height ** 2)
+        a = half_diagonal / deformation.correction_radius
+        s22 = s24 = s44 = b2 = b4 = 0.0
+        for i in range(1, 65):
+            p = i / 64
+            g = math.atan(a * p) / (a * p) - 1
+            s22, s24, s44 = s22 + p ** 4, s24 + p ** 6, s44 + p ** 8
+            b2, b4 = b2 + g * p ** 2, b4 + g * p ** 4
+        det = s22 * s44 - s24 ** 2
+        k1 = (b2 * s44 - b4 * s24) / det
+        k2 = (s22 * b4 - s24 * b2) / det
+        return min(max(k1, -1.0), 1.0), min(max(k2, -1.0), 1.0)
+
+
+class MediaProbe:
+    """what the script needs to know about the first video stream of a file, from a single ffprobe call (JSON output):
+    codec, pixel format, resolution, exact frame rates (as fractions), duration, and the presentation time and key
+    frame flag of every packet (the frame count and the key frame positions). Probes are kept for the whole process
+    and, if a cache folder is set, on disk, both keyed by the file path, size and modification time"""
+    _memory = {}
+    _STREAM_ENTRIES = ["codec_name", "pix_fmt", "width", "height", "r_frame_rate", "avg_frame_rate"]
+    # part of the disk cache entries, to be increased when the probed data changes
+    _VERSION = 1
+
+    def __init__(self, stream, start_time, duration, packets):
+        self.stream = stream
+        self.start_time = start_time
+        self.duration = duration
+        # (presentation time, is key frame) in decoding order
+        self.packets = packets
+        self.times = sorted(t for t, _ in packets)
+
+    @classmethod
+    def for_video(cls, in_video, cache_dir=None):
+        key = file_identity(in_video)
+        if key in cls._memory:
+            return cls._memory[key]
+        path = None if cache_dir is None else cache_dir / "probe" / f"{key}.json"
+        probe = None
+        if path is not None and path.is_file():
+            try:
+                data = json.loads(path.read_text(encoding="utf8"))
+                if data["version"] == cls._VERSION:
+                    probe = cls(data["stream"], data["start_time"], data["duration"],
+                                [(t, key_frame) for t, key_frame in data["packets"]])
+                    log_debug(f"probe of [{in_video.name}] loaded from: {path}")
+            except (OSError, ValueError, KeyError, TypeError):
+                probe = None
+        if probe is None:
+            probe = cls.probe(in_video)
+            if probe is None:
+                return None
+            if path is not None:
+                try:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+                    tmp_path.write_text(json.dumps({"version": cls._VERSION, "stream": probe.stream,
+                                                    "start_time": probe.start_time, "duration": probe.duration,
+                                                    "packets": probe.packets}), encoding="utf8")
+                    os.replace(tmp_path, path)
+                except OSError as error:
+                    log_debug(f"could not save the probe into [{path}]: {error}")
+        cls._memory[key] = probe
+        return probe
+
+    @classmethod
+    def probe(cls, in_video):
+        cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries",
+               f"format=start_time,duration:stream={','.join(cls._STREAM_ENTRIES)}:packet=pts_time,flags",
+               "-of", "json", str(in_video)]
+        log_debug("")
+        log_debug("command used for probing the video:")
+        log_debug(" ".join(cmd))
+        res = subprocess.run(cmd, capture_output=True, text=True)
+        try:
+            data = json.loads(res.stdout)
+            stream = {k: v for k, v in data["streams"][0].items() if k in cls._STREAM_ENTRIES}
+            packets = [(float(p["pts_time"]), "K" in p.get("flags", "")) for p in data.get("packets", [])
+                       if p.get("pts_time", "N/A") != "N/A"]
+        except (ValueError, KeyError, IndexError):
+            return None
+        if len(packets) == 0 or "width" not in stream or "height" not in stream:
+            return None
+        start_time = data.get("format", {}).get("start_time", "N/A")
+        start_time = float(start_time) if start_time != "N/A" else min(t for t, _ in packets)
+        duration = data.get("format", {}).get("duration", "N/A")
+        duration = float(duration) if duration != "N/A" else None
+        probe = cls(stream, start_time, duration, packets)
+        log_debug(f"video stream: {stream}, duration: [{duration}], frames: [{len(packets)}], key frames: "
+                  f"[{len(probe.key_frames())}]")
+        return probe
+
+    def size(self):
+        return int(self.stream["width"]), int(self.stream["height"])
+
+    def frame_rate(self):
+        """exact frame rate (a fraction) at which the frames of the video are encoded again, None if it is not known.
+        It is the stream base rate ('r_frame_rate'), unless the video has a variable frame rate, it is then the average
+        rate"""
+        if self.is_variable_frame_rate() or self._fraction("r_frame_rate") is None:
+            return self._fraction("avg_frame_rate")
+        return self._fraction("r_frame_rate")
+
+    def is_variable_frame_rate(self):
+        """the average rate is not the base one (containers often round the average rate of constant rate videos a
+        little, hence the tolerance)"""
+        r_rate, avg_rate = self._fraction("r_frame_rate"), self._fraction("avg_frame_rate")
+        return r_rate is not None and avg_rate is not None and abs(avg_rate - r_rate) > _VFR_TOLERANCE * r_rate
+
+    def _fraction(self, in_entry):
+        """'num/den' rate of the stream as a fraction, None if it is missing or zero ('0/0')"""
+        try:
+            rate = fractions.Fraction(self.stream.get(in_entry, ""))
+        except (ValueError, ZeroDivisionError):
+            return None
+        return rate if rate > 0 else None
+
+    def num_frames(self):
+        return len(self.times)
+
+    def key_frames(self):
+        """presentation times of the key frames"""
+        return sorted(t for t, key_frame in self.packets if key_frame)
+
+    def key_frame_before(self, in_frame_idx):
+        """(seek position relative to the file start, number of packets decoded from it to the end of the video) of the
+        last key frame presented at or before the frame 'in_frame_idx' (in presentation order)"""
+        frame_time = self.times[in_frame_idx]
+        for packet_idx in range(len(self.packets) - 1, -1, -1):
+            t, key_frame = self.packets[packet_idx]
+            if key_frame and t <= frame_time:
+                return t - self.start_time, len(self.packets) - packet_idx
+        return 0.0, len(self.packets)
+
+
+class RenderCache:
+    """finished transition videos kept in a folder, keyed by a hash of the input files identity (path, size and
+    modification time), of the frames used and of every rendering parameter. When the cache is above its size budget,
+    the least recently used renders are removed"""
+    def __init__(self, in_folder, max_bytes):
+        self.folder = in_folder
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(in_inputs, in_params):
+        identities = [file_identity(video) for video in in_inputs]
+        description = json.dumps({"inputs": identities, "params": in_params}, sort_keys=True)
+        return hashlib.sha1(description.encode("utf8")).hexdigest()
+
+    def restore(self, key, in_outputs):
+        """copies the cached files to 'in_outputs' (file name in the cache -> output path), False if they are not all
+        in the cache"""
+        entry = self.folder / key
+        if not all((entry / name).is_file() for name in in_outputs):
+            return False
+        try:
+            for name, output in in_outputs.items():
+                shutil.copyfile(entry / name, output)
+            # the modification time of an entry is its last use
+            os.utime(entry)
+        except OSError as error:
+            log_debug(f"could not restore the render [{key}] from the cache: {error}")
+            return False
+        return True
+
+    def store(self, key, in_outputs, in_params):
+        entry = self.folder / key
+        tmp_entry = self.folder / f"{key}.{os.getpid()}.tmp"
+        try:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            tmp_entry.mkdir(parents=True)
+            for name, output in in_outputs.items():
+                shutil.copyfile(output, tmp_entry / name)
+            (tmp_entry / "params.json").write_text(json.dumps(in_params, indent=2), encoding="utf8")
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp_entry, entry)
+        except OSError as error:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            log_debug(f"could not save the render [{key}] into the cache: {error}")
+            return
+        log_debug(f"render saved into the cache: {entry}")
+        self.evict()
+
+    def evict(self):
+        evict_least_recently_used(self.folder, self.max_bytes, "render")
+
+
+class FrameCache:
+    """decoded frames kept in a folder as raw RGB files, keyed by the input file identity (path, size and modification
+    time), the frame index (in presentation order) and the frames size (which depends on the preview scale). The files
+    are read back memory-mapped, without any decoding. The frames of a video at a given size form an entry, when the
+    cache is above its size budget the least recently used entries are removed"""
+    _SUFFIX = ".rgb"
+
+    def __init__(self, in_folder, max_bytes):
+        self.folder = in_folder
+        self.max_bytes = max_bytes
+
+    def entry(self, in_video, in_size):
+        return self.folder / f"{file_identity(in_video)}_{in_size[0]}x{in_size[1]}"
+
+    def has(self, in_entry, in_size, in_indices):
+        """True if all the frames 'in_indices' are in the entry, which is then marked as used"""
+        frame_bytes = in_size[0] * in_size[1] * 3
+        try:
+            if not all(self._frame_path(in_entry, idx).stat().st_size == frame_bytes for idx in in_indices):
+                return False
+            # the modification time of an entry is its last use
+            os.utime(in_entry)
+        except OSError:
+            return False
+        return True
+
+    def read(self, in_entry, in_idx, in_size):
+        with open(self._frame_path(in_entry, in_idx), "rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return Image.frombytes("RGB", in_size, buffer)
+
+    def write(self, in_entry, in_idx, in_img):
+        path = self._frame_path(in_entry, in_idx)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            in_entry.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(in_img.tobytes())
+            os.replace(tmp_path, path)
+        except OSError as error:
+            log_debug(f"could not save the frame [{in_idx}] into the frame cache: {error}")
+
+    def evict(self):
+        evict_least_recently_used(self.folder, self.max_bytes, "frames")
+
+    def _frame_path(self, in_entry, in_idx):
+        return in_entry / f"{in_idx:06d}{self._SUFFIX}"
+
+
 class DataHandler:
     def __init__(self):
         self.start_time = datetime.datetime.now()
@@ -668,12 +2200,42 @@ class DataHandler:
         self.phase1_vid = None
         self.phase2_vid = None
         self.merged_vid = None
-        self.fps = 30
+        self.fps = fractions.Fraction(30)
+        self.vid1_size = None
+        self.vid2_size = None
+        self.extract_to_files = False
         self.vid1_raw_images_folder = None
         self.vid2_raw_images_folder = None
         self.phase1_images = []
         self.phase2_images = []
         self.animation = None
+        self.jobs = 1
+        self.render_options = RenderOptions()
+        self.engine = ENGINE
+        self.merge = False
+        self.full_sequence = False
+        self.full_vid = None
+        self.sequence = None
+        self.inputs = []
+        self.inputs_sizes = []
+        self.num_frames = (0, 0)
+        self.decode_stats = collections.Counter()
+        self.decode_stats_lock = threading.Lock()
+        self.preview = 0.0
+        self.preview_vid = None
+        self.preview_sheet = None
+        self.profiler = Profiler()
+        self.profile_report = None
+        self.max_memory = 0
+        self.max_in_flight = None
+        self.threads = THREADS
+        self.render_cache = None
+        self.frame_cache = None
+        self.encoder_profile = ENCODER_PROFILE
+        self.encoder_threads = ENCODER_THREADS
+        self.cache_key = None
+        self.cache_params = None
+        self.cached = False
 
     def verify_arguments(self, in_args, in_tmp_path):
         self.tmp_path = in_tmp_path
@@ -694,65 +2256,596 @@ class DataHandler:
         self.phase1_vid = self.output.parent / (self.output.stem + "_phase1" + _OUTPUT_VIDEO_TYPE)
         self.phase2_vid = self.output.parent / (self.output.stem + "_phase2" + _OUTPUT_VIDEO_TYPE)
         self.merged_vid = self.output.parent / (self.output.stem + "_merged" + _OUTPUT_VIDEO_TYPE)
-        log_info(f"first input video: {self.input_vid1}")
-        log_info(f"second input video: {self.input_vid2}")
-        if in_args.merge:
-            log_debug(f"transition phase1 video: {self.phase1_vid}")
-            log_debug(f"transition phase2 video: {self.phase2_vid}")
+        self.full_vid = self.output.parent / (self.output.stem + "_full" + _OUTPUT_VIDEO_TYPE)
+        self.preview_vid = self.output.parent / (self.output.stem + "_preview" + _OUTPUT_VIDEO_TYPE)
+        self.preview_sheet = self.output.parent / (self.output.stem + "_preview.png")
+        self.merge = in_args.merge
+        self.full_sequence = in_args.full_sequence
+        if self.is_batch():
+            log_info(f"batch of [{len(self.inputs) - 1}] transitions between [{len(self.inputs)}] videos, outputs: "
+                     f"{self._pair_output(0, '_*').name} ... {self._pair_output(len(self.inputs) - 2, '_*').name}")
+        else:
+            log_info(f"first input video: {self.input_vid1}")
+            log_info(f"second input video: {self.input_vid2}")
+        if self.is_batch():
+            log_debug(f"input videos: {[str(video) for video in self.inputs]}")
+        elif self.full_sequence:
+            log_info(f"output full sequence video: {self.full_vid}")
+        elif self.preview > 0:
+            log_info(f"output preview video: {self.preview_vid}, contact sheet: {self.preview_sheet}")
+        elif in_args.merge:
             log_info(f"output transition merged video: {self.merged_vid}")
         else:
             log_info(f"output transition phase1 video: {self.phase1_vid}")
             log_info(f"output transition phase2 video: {self.phase2_vid}")
-        self._get_fps_from_video()
-        log_info(f"frames per second (FPS): {self.fps}")
-
-        self.vid1_raw_images_folder = self.tmp_path / "1_phase1_raw"
-        self.vid2_raw_images_folder = self.tmp_path / "1_phase2_raw"
-        self.vid1_raw_images_folder.mkdir()
-        log_debug(f"created vid1_raw_images_folder: {self.vid1_raw_images_folder}")
-        self.vid2_raw_images_folder.mkdir()
-        log_debug(f"created vid2_raw_images_folder: {self.vid2_raw_images_folder}")
-        if not self._extract_phase1_images(in_args.num_frames):
-            return False
-        num_frames_for_vid2 = in_args.num_frames
+        with self.profiler.stage("probing"):
+            probes = [self._probe(video) for video in self.inputs]
+        if any(probe is None for probe in probes):
+            return False
+        self.inputs_sizes = [probe.size() for probe in probes]
+        self._set_fps(self.inputs[0])
+        if self.preview > 0:
+            # the frames are downscaled by ffmpeg while decoding, all the effects are relative to the frames size
+            self.inputs_sizes = [self._preview_size(size) for size in self.inputs_sizes]
+            log_info(f"preview at [{self.preview:.0%}] of the original resolution")
+        self.vid1_size, self.vid2_size = self.inputs_sizes[:2]
+        log_debug(f"frames size, video1: {self.vid1_size}, video2: {self.vid2_size}")
+        self.num_frames = (in_args.num_frames, in_args.num_frames)
         if self.animation == Animations.long_translation or self.animation == Animations.long_translation_inv:
-            num_frames_for_vid2 = 2 * in_args.num_frames
-        if not self._extract_phase2_images(num_frames_for_vid2):
+            self.num_frames = (in_args.num_frames, 2 * in_args.num_frames)
+        if self.is_batch():
+            log_info("the frames of each video are extracted once, while the transitions are rendered")
+            # the first and last frames of up to 3 videos are kept in memory
+            self.limit_memory(3 * sum(self.num_frames))
+            return True
+
+        if self.render_cache is not None:
+            self.cache_params = self._render_params(in_args)
+            self.cache_key = RenderCache.make_key(self.inputs, self.cache_params)
+            if self.render_cache.restore(self.cache_key, self._cached_outputs()):
+                log_info(f"the transition was found in the render cache [{self.cache_key[:12]}], nothing is rendered")
+                self.cached = True
+                return True
+            log_debug(f"render cache key: [{self.cache_key}]")
+
+        if self.engine == "ffmpeg":
+            log_info("the frames are rendered by ffmpeg, nothing is extracted")
+            return True
+
+        # frames are streamed from ffmpeg into memory, writing them to files is only kept for debugging
+        self.extract_to_files = in_args.debug
+        if self.extract_to_files:
+            self.vid1_raw_images_folder = self.tmp_path / "1_phase1_raw"
+            self.vid2_raw_images_folder = self.tmp_path / "1_phase2_raw"
+            self.vid1_raw_images_folder.mkdir()
+            log_debug(f"created vid1_raw_images_folder: {self.vid1_raw_images_folder}")
+            self.vid2_raw_images_folder.mkdir()
+            log_debug(f"created vid2_raw_images_folder: {self.vid2_raw_images_folder}")
+        # the last frames of the first video are kept in memory during the rendering
+        self.limit_memory(self.num_frames[0])
+        with self.profiler.stage("extraction"):
+            if not self._extract_phase1_images(in_args.num_frames):
+                return False
+            num_frames_for_vid2 = self.num_frames[1]
+            if not self._extract_phase2_images(num_frames_for_vid2):
+                return False
+        log_info(f"number of frames for phase1: [{len(self.phase1_images)}], for phase2: [{self.num_frames[1]}]"
+                 f"{'' if self.extract_to_files else ' (decoded while the transition is rendered)'}")
+        if self.full_sequence:
+            with self.profiler.stage("full sequence planning"):
+                return self._plan_full_sequence(in_args.num_frames, num_frames_for_vid2)
+        return True
+
+    def open_phase_encoders(self):
+        """starts one ffmpeg encoder per phase, frames are written to them while the transition is processed. When
+        merging, both phases go to a single encoder, so that the merged video is encoded only once"""
+        output_args = self._encoder_args()
+        if self.full_sequence:
+            outputs = [(self.sequence["middle_vid"], self.vid1_size, "the re-encoded part of the sequence")]
+            output_args = self.sequence["encoder_args"] + self._encoder_args([])
+        elif self.preview > 0:
+            encoder = self._open_encoders([(self.preview_vid, self.vid1_size, "the preview")], _PREVIEW_ENCODER_ARGS)[0]
+            return [PreviewWriter(encoder, self.preview_sheet)] * 2
+        elif self.merge:
+            outputs = [(self.merged_vid, self.vid1_size, "both phases")]
+        else:
+            outputs = [(self.phase1_vid, self.vid1_size, "phase_1"), (self.phase2_vid, self.vid2_size, "phase_2")]
+        return self._open_encoders(outputs, output_args)
+
+    def _encoder_args(self, in_profile_args=None):
+        """output arguments of the encoders: those of the encoder profile (or 'in_profile_args'), and the number of
+        threads of each encoder if it is set"""
+        args = list(_ENCODER_PROFILES[self.encoder_profile] if in_profile_args is None else in_profile_args)
+        if self.encoder_threads > 0:
+            args += ["-threads", str(self.encoder_threads)]
+        return args
+
+    def _open_encoders(self, in_outputs, in_output_args):
+        """'in_outputs' is a list of (video, frames size, name), returns an encoder per phase (the same one is used by
+        both phases if there is only one output)"""
+        encoders = []
+        for output_video, size, name in in_outputs:
+            cmd = ["ffmpeg", "-hide_banner", "-y", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{size[0]}x{size[1]}",
+                   "-framerate", str(self.fps), "-i", "-", "-r", str(self.fps), *in_output_args, str(output_video)]
+            encoders.append(FFmpegPipe(cmd, f"command used for encoding {name} frames into a video ...", size,
+                                       encode=True))
+        return encoders if len(encoders) == 2 else encoders * 2
+
+    def render_with_ffmpeg(self, in_phase1_actions, in_phase2_actions, merge):
+        """'ffmpeg' engine: decodes, renders and encodes the whole transition with a single ffmpeg process"""
+        log_info("")
+        log_info(" Transition rendering with ffmpeg ".center(80, "="))
+        num_frames1 = len(in_phase1_actions[0].values)
+        num_frames2 = len(in_phase2_actions[0].values)
+        # the positions come from the probed frames (exact with variable frame rates): the first video is decoded
+        # from the key frame preceding its last frames, which are selected by reversing the few frames before its end.
+        # The second video is read up to 2 frames after the ones used
+        input_args1 = self._last_frames_args(self.input_vid1, num_frames1)
+        probe1, probe2 = self._probe(self.input_vid1), self._probe(self.input_vid2)
+        if input_args1 is None or probe2 is None:
+            return False
+        _, num_decoded1 = probe1.key_frame_before(max(0, probe1.num_frames() - num_frames1))
+        skip1 = max(0, num_decoded1 - num_frames1 - 2)
+        input_args2 = ["-i", str(self.input_vid2)]
+        if probe2.num_frames() > num_frames2 + 2:
+            input_args2 = ["-to", f"{probe2.times[num_frames2 + 2] - probe2.start_time:.6f}"] + input_args2
+        phases = [("0:v", f"trim=start_frame={skip1},reverse,trim=end_frame={num_frames1},reverse", in_phase1_actions,
+                   self.vid1_size),
+                  ("1:v", f"trim=end_frame={num_frames2}", in_phase2_actions, self.vid2_size)]
+        try:
+            graph, out_labels = FFmpegFilterGraph(self.fps).build(phases, merge)
+        except ValueError as error:
+            log_error(f"this transition cannot be rendered by the ffmpeg engine: {error}")
+            return False
+        output_videos = [self.merged_vid] if merge else [self.phase1_vid, self.phase2_vid]
+        cmd = ["ffmpeg", "-hide_banner", "-y", *input_args1, *input_args2, "-filter_complex", graph]
+        for out_label, output_video in zip(out_labels, output_videos):
+            cmd += ["-map", f"[{out_label}]", "-r", str(self.fps), *self._encoder_args(), str(output_video)]
+        with self.profiler.stage("rendering (ffmpeg engine)"):
+            self._exec_command(cmd, "command used for rendering the transition with ffmpeg:")
+        for output_video in output_videos:
+            if not output_video.is_file():
+                log_error(f"ffmpeg failed to render the transition into: {output_video}")
+                return False
+        return True
+
+    def close_phase_encoders(self, in_encoders):
+        log_info("finishing the encoding of the phases videos ...")
+        if self.full_sequence:
+            outputs = [(in_encoders[0], self.sequence["middle_vid"])]
+        elif self.preview > 0:
+            outputs = [(in_encoders[0], self.preview_vid)]
+        elif self.merge:
+            outputs = [(in_encoders[0], self.merged_vid)]
+        else:
+            outputs = zip(in_encoders, [self.phase1_vid, self.phase2_vid])
+        with self.profiler.stage("encoding (finishing)"):
+            return self._close_encoders(outputs)
+
+    @staticmethod
+    def _close_encoders(in_outputs):
+        success = True
+        for encoder, output_video in in_outputs:
+            if not encoder.close() or not output_video.is_file():
+                log_error(f"ffmpeg failed to encode images into: {output_video}")
+                success = False
+        return success
+
+    def is_batch(self):
+        return len(self.inputs) > 2
+
+    def _render_params(self, in_args):
+        """everything the rendered videos depend on, besides the input files ('in_args.num_frames' frames are taken at
+        the end of the first video, and 'self.num_frames[1]' at the start of the second one)"""
+        return {"version": _RENDER_CACHE_VERSION, "animation": self.animation.name, "num_frames": list(self.num_frames),
+                "max_rotation": in_args.max_rotation, "max_distortion": in_args.max_distortion,
+                "max_blur": in_args.max_blur, "max_brightness": in_args.max_brightness, "max_zoom": in_args.max_zoom,
+                "engine": self.engine, "geometry_engine": self.render_options.geometry_engine,
+                "distortion_engine": self.render_options.distortion_engine,
+                "blur_engine": self.render_options.blur_engine, "merge": self.merge,
+                "full_sequence": self.full_sequence, "preview": self.preview, "fps": str(self.fps),
+                "sizes": [list(size) for size in self.inputs_sizes[:2]], "encoder_args": self._encoder_args()}
+
+    def _cached_outputs(self):
+        """output files of the transition, by their name in the render cache"""
+        if self.full_sequence:
+            return {"full.mp4": self.full_vid}
+        if self.preview > 0:
+            return {"preview.mp4": self.preview_vid, "preview.png": self.preview_sheet}
+        if self.merge:
+            return {"merged.mp4": self.merged_vid}
+        return {"phase1.mp4": self.phase1_vid, "phase2.mp4": self.phase2_vid}
+
+    def store_render(self):
+        if self.render_cache is not None and not self.cached and not self.is_batch():
+            with self.profiler.stage("render cache"):
+                self.render_cache.store(self.cache_key, self._cached_outputs(), self.cache_params)
+
+    def limit_memory(self, in_num_resident_frames):
+        """lowers the number of rendering processes (and of frames in flight) so that the estimated peak memory stays
+        within '--max_memory'. 'in_num_resident_frames' is the number of decoded frames kept in memory meanwhile"""
+        width, height = max(size[0] for size in self.inputs_sizes), max(size[1] for size in self.inputs_sizes)
+        frame_bytes = width * height * 3
+        working_set = _FRAME_WORKING_SET[self.render_options.geometry_engine] * frame_bytes
+        # each process has its own distortion cache, it holds at most the geometry of every frame of the transition
+        # (two float32 coordinates per pixel)
+        distortion_cache = min(self.render_options.distortion_cache_mb * 2 ** 20,
+                               sum(self.num_frames) * width * height * 8)
+        # each process renders a frame, and 2 more frames per process wait to be rendered and to be encoded
+        per_job = working_set + 2 * 2 * frame_bytes + distortion_cache
+        fixed = _BASE_MEMORY + in_num_resident_frames * frame_bytes + _ENCODER_BYTES_PER_PIXEL * width * height
+        log_debug(f"estimated peak memory: [{(fixed + self.jobs * per_job) / 2 ** 20:.0f} MB] with "
+                  f"[{self.jobs}] rendering processes")
+        if self.max_memory > 0:
+            budget = self.max_memory * 2 ** 20
+            jobs = min(self.jobs, int((budget - fixed) // per_job))
+            if jobs < 1:
+                log_warning(f"the memory budget of [{self.max_memory} MB] is too low, at least "
+                            f"[{(fixed + per_job) / 2 ** 20:.0f} MB] are needed, rendering with a single process")
+                jobs = 1
+            if jobs < self.jobs:
+                log_info(f"number of rendering processes lowered from [{self.jobs}] to [{jobs}] to stay within the "
+                         f"memory budget of [{self.max_memory} MB]")
+                self.jobs = jobs
+            self.max_in_flight = 2 * self.jobs
+        # the cores left by the processes that are not started go to the threads of the others
+        self.render_options.threads = self._render_threads()
+
+    def _render_threads(self):
+        """threads per rendering process: '--threads', or the CPU cores shared between the rendering processes"""
+        return self.threads if self.threads > 0 else max(1, (os.cpu_count() or 1) // self.jobs)
+
+    def check_memory(self):
+        peak = Profiler.peak_memory()
+        if self.max_memory <= 0 or peak is None:
+            return
+        peak_mb = max(peak["self"], peak["children"]) / 2 ** 20
+        if peak_mb > self.max_memory:
+            log_warning(f"the peak memory [{peak_mb:.0f} MB] exceeded the budget of [{self.max_memory} MB]")
+
+    def _preview_size(self, in_size):
+        # even dimensions, as needed by the yuv420p encoding
+        return tuple(max(2, int(round(length * self.preview / 2)) * 2) for length in in_size)
+
+    def _scale_args(self, in_size):
+        if self.preview <= 0:
+            return []
+        return ["-vf", f"scale={in_size[0]}:{in_size[1]}:flags=area"]
+
+    def open_preview(self, in_open):
+        """opens the contact sheet if 'in_open' is True, or if it is None and a display is available (a text browser
+        could otherwise be started, or the script could wait for a viewer that never shows up)"""
+        if in_open is None:
+            in_open = self._has_display()
+            if not in_open:
+                log_debug("no display detected, the preview contact sheet is not opened")
+        if in_open and not webbrowser.open(self.preview_sheet.resolve().as_uri()):
+            log_debug("no viewer available to open the preview contact sheet")
+
+    @staticmethod
+    def _has_display():
+        if sys.platform == "win32":
+            return True
+        if sys.platform == "darwin":
+            return "SSH_CONNECTION" not in os.environ
+        return any(os.environ.get(var, "") != "" for var in ["DISPLAY", "WAYLAND_DISPLAY"])
+
+    def _pair_output(self, in_pair_idx, in_suffix):
+        return self.output.parent / f"{self.output.stem}_{in_pair_idx + 1:03d}{in_suffix}{_OUTPUT_VIDEO_TYPE}"
+
+    def _extract_clip_frames(self, in_clip_idx):
+        with self.profiler.stage("extraction (background)"):
+            return self._extract_clip_frames_now(in_clip_idx)
+
+    def _extract_clip_frames_now(self, in_clip_idx):
+        """frames of a video used by the transitions: its first frames (end of the transition with the previous video)
+        and its last frames (start of the transition with the next one). Each video goes through this only once"""
+        video, size = self.inputs[in_clip_idx], self.inputs_sizes[in_clip_idx]
+        first, last = [], []
+        if in_clip_idx > 0:
+            first = list(self._first_frames(video, size, self.num_frames[1],
+                                            f"command used for streaming the first frames of: {video.name}"))
+        if in_clip_idx < len(self.inputs) - 1:
+            input_args = self._last_frames_args(video, self.num_frames[0])
+            if input_args is None:
+                raise ValueError(f"could not probe: {video}")
+            last = self._last_frames(video, size, self.num_frames[0], input_args,
+                                     f"command used for streaming the last frames of: {video.name}")
+        if (in_clip_idx > 0 and len(first) < self.num_frames[1]) or \
+                (in_clip_idx < len(self.inputs) - 1 and len(last) < self.num_frames[0]):
+            raise ValueError(f"not enough frames could be extracted from: {video}")
+        return first, last
+
+    def render_batch(self, in_phase1_actions, in_phase2_actions, debug=False):
+        """renders the transitions between each pair of consecutive videos. The pipeline overlaps the extraction of the
+        next videos (thread pool running ffmpeg), the rendering of the current pair (shared process pool) and the end of
+        the encoding of the previous pair (closed in the background)"""
+        num_pairs = len(self.inputs) - 1
+        extractions = {}
+        closings = []
+        success = True
+        render_executor = None
+        if self.jobs > 1:
+            render_executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as io_executor, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=1) as close_executor:
+            try:
+                for pair_idx in range(num_pairs):
+                    # the videos of this pair and of the next one are extracted in advance
+                    for clip_idx in range(pair_idx, min(pair_idx + 3, len(self.inputs))):
+                        if clip_idx not in extractions:
+                            extractions[clip_idx] = io_executor.submit(self._extract_clip_frames, clip_idx)
+                    try:
+                        with self.profiler.stage("extraction (waiting)"):
+                            phase1_images = extractions[pair_idx].result()[1]
+                            phase2_images = extractions[pair_idx + 1].result()[0]
+                    except ValueError as error:
+                        log_error(str(error))
+                        success = False
+                        break
+                    # the frames of a video are released as soon as both of its transitions are rendered
+                    del extractions[pair_idx]
+                    log_info("")
+                    log_info(f" transition [{pair_idx + 1}/{num_pairs}]: {self.inputs[pair_idx].name} -> "
+                             f"{self.inputs[pair_idx + 1].name} ".center(80, "#"))
+                    if self.merge:
+                        outputs = [(self._pair_output(pair_idx, "_merged"), self.inputs_sizes[pair_idx],
+                                    "both phases")]
+                    else:
+                        outputs = [(self._pair_output(pair_idx, "_phase1"), self.inputs_sizes[pair_idx], "phase_1"),
+                                   (self._pair_output(pair_idx, "_phase2"), self.inputs_sizes[pair_idx + 1], "phase_2")]
+                    # each transition has the frame rate of its own first video
+                    self._set_fps(self.inputs[pair_idx])
+                    encoders = self._open_encoders(outputs, self._encoder_args())
+                    working_dir = self.tmp_path / f"pair_{pair_idx + 1:03d}"
+                    working_dir.mkdir(exist_ok=True)
+                    with self.profiler.stage("rendering"):
+                        AnimationImages.make_transition(working_dir, phase1_images, phase2_images, in_phase1_actions,
+                                                        in_phase2_actions, encoders, self.render_options, debug,
+                                                        self.jobs, render_executor, self.profiler, self.max_in_flight)
+                    closings.append(close_executor.submit(self._close_encoders,
+                                                          [(enc, output[0]) for enc, output in zip(encoders, outputs)]))
+            finally:
+                if render_executor is not None:
+                    render_executor.shutdown(cancel_futures=True)
+            log_info("finishing the encoding of the transitions videos ...")
+            with self.profiler.stage("encoding (finishing)"):
+                for closing in closings:
+                    success = closing.result() and success
+        self.log_decode_stats()
+        return success
+
+    def remove_inputs(self):
+        for video in self.inputs:
+            log_debug(f"remove original video: {video}")
+            video.unlink()
+
+    def _plan_full_sequence(self, in_num_frames1, in_num_frames2):
+        """finds where the inputs can be cut for the full sequence: the GOPs of the first video ending before the
+        transition, and the ones of the second video starting after it, are stream-copied. Only the frames between these
+        key frames and the transition are decoded and encoded again with it"""
+        probe1 = self._probe(self.input_vid1)
+        probe2 = self._probe(self.input_vid2)
+        if probe1 is None or probe2 is None:
             return False
-        log_info(f"number of frames for phase1: [{len(self.phase1_images)}], for phase2: [{len(self.phase2_images)}]")
+        info1, info2 = probe1.stream, probe2.stream
+        packets1, packets2 = probe1.packets, probe2.packets
+        times1, times2 = probe1.times, probe2.times
+        if len(times1) < in_num_frames1 or len(times2) < in_num_frames2:
+            log_error("the input videos are shorter than the transition")
+            return False
+        # copied frames: video1[:copy1] and video2[copy2:], the key frames must exactly start the copied parts
+        copy1, copy2 = 0, len(times2)
+        if info1["codec_name"] in _COPYABLE_CODECS:
+            transition_start = times1[len(times1) - in_num_frames1]
+            keys = [t for t, key in packets1 if key and t <= transition_start]
+            copy1 = times1.index(max(keys)) if len(keys) > 0 else 0
+        same_params = all(info1.get(k) == info2.get(k) for k in ["codec_name", "pix_fmt", "width", "height",
+                                                                  "r_frame_rate"])
+        if same_params and info2["codec_name"] in _COPYABLE_CODECS:
+            transition_end = times2[in_num_frames2 - 1]
+            keys = [t for t, key in packets2 if key and t > transition_end]
+            copy2 = times2.index(min(keys)) if len(keys) > 0 else len(times2)
+        else:
+            log_info("the second video does not have the same codec parameters as the first one, all of it is encoded")
+        encoder_args = _ENCODER_PROFILES[self.encoder_profile]
+        if copy1 > 0 or copy2 < len(times2):
+            # the encoder profile is not used, the re-encoded part must have the parameters of the copied ones
+            encoder_args = ["-vcodec", info1["codec_name"], "-pix_fmt", info1["pix_fmt"]]
+            # the codec headers are repeated in each part, as they are not the same for all of them
+            encoder_args += ["-bsf:v", f"{info1['codec_name']}_mp4toannexb"]
+        self.sequence = {"copy1": copy1, "copy2": copy2, "copy1_time": times1[copy1] - probe1.start_time,
+                         "copy2_time": times2[copy2] - probe2.start_time if copy2 < len(times2) else None,
+                         "head_frames": len(times1) - in_num_frames1 - copy1,
+                         "tail_frames": copy2 - in_num_frames2, "skip_frames": in_num_frames2,
+                         "codec": info1["codec_name"], "encoder_args": encoder_args,
+                         "middle_vid": self.tmp_path / ("sequence_middle" + _OUTPUT_VIDEO_TYPE)}
+        log_info(f"full sequence: stream-copying [{copy1}/{len(times1)}] frames of the first video and "
+                 f"[{len(times2) - copy2}/{len(times2)}] of the second one, encoding [{len(times1) - copy1 + copy2}] "
+                 f"frames")
         return True
 
-    def final_images_to_video(self, res_folders):
-        output_videos = [self.phase1_vid, self.phase2_vid]
-        fps = str(self.fps)
-        for idx in range(2):
-            log_info(f"merging phase_{idx} images into a video ...")
-            img_names = [f.stem for f in res_folders[idx].glob("*.png")]
-            img_names.sort()
-            start_idx = f"{max(int(img_names[0]) - 1, 0):04d}"
-            cmd = ["ffmpeg", "-hide_banner", "-start_number", start_idx, "-framerate", fps, "-y", "-r", fps,  "-i",
-                   str(res_folders[idx] / "%04d.png"), "-r", fps, "-vcodec", _OUTPUT_VIDEO_CODEC,
-                   str(output_videos[idx])]
-            self._exec_command(cmd, f"command used for merging phase_{idx} images into a video ...")
-            if not output_videos[idx].is_file():
-                log_error(f"ffmpeg failed to convert images to: {output_videos[idx]}")
+    def write_sequence_frames(self, in_encoder, head):
+        """decodes the frames of the full sequence that are encoded again with the transition: between the last copied
+        key frame of the first video and the transition ('head'), or between the transition and the first copied key
+        frame of the second video"""
+        if head:
+            if self.sequence["head_frames"] == 0:
+                return
+            input_args = [*self._seek_args(self.sequence["copy1_time"]), "-i", str(self.input_vid1), "-frames:v",
+                          str(self.sequence["head_frames"])]
+            size, skip, name = self.vid1_size, 0, "first"
+        else:
+            if self.sequence["tail_frames"] == 0:
+                return
+            input_args = ["-i", str(self.input_vid2), "-frames:v",
+                          str(self.sequence["skip_frames"] + self.sequence["tail_frames"])]
+            size, skip, name = self.vid2_size, self.sequence["skip_frames"], "second"
+        cmd = ["ffmpeg", "-hide_banner", *input_args, "-an", "-sn", "-fps_mode", "passthrough", "-f", "rawvideo",
+               "-pix_fmt", "rgb24", "-"]
+        decoder = FFmpegPipe(cmd, f"command used for decoding the re-encoded frames of the {name} video:", size)
+        img = decoder.read_frame()
+        while img is not None:
+            if skip > 0:
+                skip -= 1
+            else:
+                in_encoder.write_frame(img)
+            img = decoder.read_frame()
+        decoder.close()
+
+    def assemble_full_sequence(self):
+        """joins the stream-copied parts of the inputs and the re-encoded part into the full sequence video"""
+        log_info("assembling the full sequence ...")
+        parts = []
+        copy_args = ["-map", "0:v:0", "-c", "copy", "-bsf:v", f"{self.sequence['codec']}_mp4toannexb"]
+        if self.sequence["copy1"] > 0:
+            parts.append(self.tmp_path / ("sequence_head" + _OUTPUT_VIDEO_TYPE))
+            cmd = ["ffmpeg", "-hide_banner", "-y", "-i", str(self.input_vid1), *copy_args, "-frames:v",
+                   str(self.sequence["copy1"]), str(parts[-1])]
+            self._exec_command(cmd, "command used for copying the beginning of the first video:")
+        parts.append(self.sequence["middle_vid"])
+        if self.sequence["copy2_time"] is not None:
+            parts.append(self.tmp_path / ("sequence_tail" + _OUTPUT_VIDEO_TYPE))
+            cmd = ["ffmpeg", "-hide_banner", "-y", *self._seek_args(self.sequence["copy2_time"]), "-i",
+                   str(self.input_vid2), *copy_args, str(parts[-1])]
+            self._exec_command(cmd, "command used for copying the end of the second video:")
+        for part in parts:
+            if not part.is_file():
+                log_error(f"ffmpeg failed to create the sequence part: {part}")
                 return False
+        parts_list = self.tmp_path / "sequence_parts.txt"
+        with open(parts_list, "w", encoding="utf8") as f:
+            f.writelines("file '" + str(part.resolve()).replace("'", "'\\''") + "'\n" for part in parts)
+        cmd = ["ffmpeg", "-hide_banner", "-y", "-f", "concat", "-safe", "0", "-i", str(parts_list), "-c", "copy",
+               str(self.full_vid)]
+        self._exec_command(cmd, "command used for joining the full sequence parts:")
+        if not self.full_vid.is_file():
+            log_error(f"ffmpeg failed to join the full sequence into: {self.full_vid}")
+            return False
         return True
 
     def _verify_critical_info(self, in_args):
         if shutil.which("ffmpeg") is None:
             log_error("'ffmpeg' is not installed, please install it before use")
             return False
-        if len(in_args.input) < 2 or len(in_args.input) > 2:
-            log_error(f"2 input videos needed, [{len(in_args.input)}] provided")
+        if shutil.which("ffprobe") is None:
+            log_error("'ffprobe' is not installed (it is usually shipped with ffmpeg), please install it before use")
+            return False
+        self.inputs = [pathlib.Path(video) for video in in_args.input]
+        if in_args.manifest != "":
+            manifest = pathlib.Path(in_args.manifest)
+            if not manifest.is_file():
+                log_error(f"could not find the manifest under: {manifest}")
+                return False
+            # one video per line, relative paths are relative to the manifest folder, '#' starts a comment
+            for line in manifest.read_text(encoding="utf8").splitlines():
+                line = line.split("#")[0].strip()
+                if line != "":
+                    self.inputs.append(manifest.parent / pathlib.Path(line).expanduser())
+        if len(self.inputs) < 2:
+            log_error(f"at least 2 input videos needed, [{len(self.inputs)}] provided")
+            return False
+        for idx, video in enumerate(self.inputs):
+            if not video.is_file():
+                log_error(f"could not find input video num {idx + 1} under: {video}")
+                return False
+        self.input_vid1, self.input_vid2 = self.inputs[:2]
+        if in_args.jobs < 0:
+            log_error(f"the number of rendering processes cannot be negative (provided: [{in_args.jobs}])")
+            return False
+        self.jobs = in_args.jobs if in_args.jobs > 0 else (os.cpu_count() or 1)
+        encoder_profile = in_args.encoder_profile.lower().strip()
+        if encoder_profile not in _ENCODER_PROFILES:
+            log_error(f"encoder profile [{in_args.encoder_profile}] not recognized, possible values: "
+                      f"{list(_ENCODER_PROFILES)}")
+            return False
+        if in_args.encoder_threads < 0:
+            log_error(f"the number of encoder threads cannot be negative (provided: [{in_args.encoder_threads}])")
+            return False
+        self.encoder_profile = encoder_profile
+        self.encoder_threads = in_args.encoder_threads
+        log_debug(f"encoder profile: [{encoder_profile}], encoder arguments: {self._encoder_args()}")
+        distortion_engine = in_args.distortion_engine.lower().strip()
+        if distortion_engine not in _DISTORTION_ENGINES:
+            log_error(f"distortion engine [{in_args.distortion_engine}] not recognized, possible values: "
+                      f"{_DISTORTION_ENGINES}")
+            return False
+        if distortion_engine != "mesh" and np is None:
+            log_warning(f"the distortion engine [{distortion_engine}] needs 'numpy' to be installed, "
+                        f"falling back to [mesh]")
+            distortion_engine = "mesh"
+        if in_args.distortion_cache_mb < 0:
+            log_error(f"the distortion cache size cannot be negative (provided: [{in_args.distortion_cache_mb}])")
+            return False
+        cache_dir = None
+        if in_args.cache_dir != "":
+            cache_dir = pathlib.Path(in_args.cache_dir).expanduser().resolve()
+            log_debug(f"cache folder: {cache_dir}")
+        geometry_engine = in_args.geometry_engine.lower().strip()
+        if geometry_engine not in _GEOMETRY_ENGINES:
+            log_error(f"geometry engine [{in_args.geometry_engine}] not recognized, possible values: "
+                      f"{_GEOMETRY_ENGINES}")
+            return False
+        if geometry_engine != "chain" and np is None:
+            log_warning(f"the geometry engine [{geometry_engine}] needs 'numpy' to be installed, falling back to "
+                        f"[chain]")
+            geometry_engine = "chain"
+        if in_args.threads < 0:
+            log_error(f"the number of threads per rendering process cannot be negative (provided: [{in_args.threads}])")
+            return False
+        self.threads = in_args.threads
+        blur_engine = in_args.blur_engine.lower().strip()
+        if blur_engine not in _BLUR_ENGINES:
+            log_error(f"blur engine [{in_args.blur_engine}] not recognized, possible values: {_BLUR_ENGINES}")
+            return False
+        frame_transport = in_args.frame_transport.lower().strip()
+        if frame_transport not in _FRAME_TRANSPORTS:
+            log_error(f"frame transport [{in_args.frame_transport}] not recognized, possible values: "
+                      f"{_FRAME_TRANSPORTS}")
+            return False
+        debug_format = in_args.debug_format.lower().strip()
+        if debug_format not in _DEBUG_FORMATS:
+            log_error(f"debug images format [{in_args.debug_format}] not recognized, possible values: {_DEBUG_FORMATS}")
+            return False
+        if not 0 <= in_args.debug_compress_level <= 9:
+            log_error(f"the png compress level must be in [0, 9] (provided: [{in_args.debug_compress_level}])")
+            return False
+        self.render_options = RenderOptions(distortion_engine, in_args.distortion_cache_mb, cache_dir, geometry_engine,
+                                            self._render_threads(), blur_engine, frame_transport, debug_format,
+                                            in_args.debug_compress_level)
+        if in_args.render_cache_mb < 0:
+            log_error(f"the render cache size cannot be negative (provided: [{in_args.render_cache_mb}])")
+            return False
+        if cache_dir is not None and not in_args.no_cache and in_args.render_cache_mb > 0 and not self.is_batch():
+            self.render_cache = RenderCache(cache_dir / "renders", in_args.render_cache_mb * 2 ** 20)
+        if in_args.frame_cache_mb < 0:
+            log_error(f"the frame cache size cannot be negative (provided: [{in_args.frame_cache_mb}])")
             return False
-        self.input_vid1 = pathlib.Path(in_args.input[0])
-        if not self.input_vid1.is_file():
-            log_error(f"could not find first video under: {self.input_vid1}")
+        # the frames are only cached when they are streamed into memory (not when extracted as debug images)
+        if cache_dir is not None and in_args.frame_cache_mb > 0 and not in_args.debug:
+            self.frame_cache = FrameCache(cache_dir / "frames", in_args.frame_cache_mb * 2 ** 20)
+        self.engine = in_args.engine.lower().strip()
+        if self.engine not in _ENGINES:
+            log_error(f"engine [{in_args.engine}] not recognized, possible values: {_ENGINES}")
             return False
-        self.input_vid2 = pathlib.Path(in_args.input[1])
-        if not self.input_vid2.is_file():
-            log_error(f"could not find second video under: {self.input_vid2}")
+        if self.engine == "ffmpeg" and in_args.full_sequence:
+            log_error("the full sequence output is only available with the [pil] engine")
+            return False
+        if self.is_batch() and (self.engine == "ffmpeg" or in_args.full_sequence):
+            log_error("the batch of transitions (more than 2 input videos) is only available with the [pil] engine, "
+                      "and without the full sequence output")
+            return False
+        if in_args.max_memory < 0:
+            log_error(f"the memory budget cannot be negative (provided: [{in_args.max_memory}])")
+            return False
+        self.max_memory = in_args.max_memory
+        if in_args.preview < 0 or in_args.preview > 1:
+            log_error(f"the preview scale should be in the range [0, 1] (provided: [{in_args.preview}])")
+            return False
+        self.preview = in_args.preview if in_args.preview < 1 else 0.0
+        if self.preview > 0 and (self.engine == "ffmpeg" or in_args.full_sequence or self.is_batch()):
+            log_error("the preview is only available with the [pil] engine, for a single transition, and without the "
+                      "full sequence output")
             return False
         if in_args.num_frames < 2 or in_args.num_frames > 100:
             log_error(f"number of frames per phase should be in the range [2, 100] (provided: [{in_args.num_frames}])")
@@ -770,13 +2863,16 @@ class DataHandler:
         return True
 
     def _extract_phase1_images(self, in_num_frames):
-        duration_ms = int(math.ceil(1000 * (in_num_frames + 2) / self.fps))
-        cmd = ["ffmpeg", "-hide_banner", "-sseof", f"-{duration_ms}ms", "-i", str(self.input_vid1),
-               str(self.vid1_raw_images_folder / "%04d.png")]
-        self._exec_command(cmd, "command used for extracting images from video num 1:")
-        for img_f in self.vid1_raw_images_folder.glob("*.png"):
-            self.phase1_images.append(img_f)
-        self.phase1_images.sort()
+        input_args = self._last_frames_args(self.input_vid1, in_num_frames)
+        if input_args is None:
+            return False
+        if self.extract_to_files:
+            self.phase1_images = self._extract_images_to_folder(
+                input_args, self.vid1_size, self.vid1_raw_images_folder,
+                "command used for extracting images from video num 1:", keep_last=in_num_frames)
+        else:
+            self.phase1_images = self._last_frames(self.input_vid1, self.vid1_size, in_num_frames, input_args,
+                                                   "command used for streaming frames from video num 1:")
         if len(self.phase1_images) < in_num_frames:
             log_error(f"could not extract [{in_num_frames}] images from the first video "
                       f"({len(self.phase1_images)} extracted)")
@@ -786,13 +2882,23 @@ class DataHandler:
         return True
 
     def _extract_phase2_images(self, in_num_frames):
-        duration_ms = int(math.ceil(1000 * (in_num_frames + 2) / self.fps))
-        cmd = ["ffmpeg", "-hide_banner", "-to", f"{duration_ms}ms", "-i", str(self.input_vid2),
-               str(self.vid2_raw_images_folder / "%04d.png")]
-        self._exec_command(cmd, "command used for extracting images from video num 2:")
-        for img_f in self.vid2_raw_images_folder.glob("*.png"):
-            self.phase2_images.append(img_f)
-        self.phase2_images.sort()
+        input_args = self._first_frames_args(self.input_vid2, in_num_frames)
+        if not self.extract_to_files:
+            probe = self._probe(self.input_vid2)
+            if probe is None:
+                return False
+            if probe.num_frames() < in_num_frames:
+                log_error(f"could not extract [{in_num_frames}] images from the second video (it has "
+                          f"{probe.num_frames()} frames)")
+                return False
+            # the frames are decoded in the background while the transition is rendered
+            self.phase2_images = prefetch(self._first_frames(
+                self.input_vid2, self.vid2_size, in_num_frames, "command used for streaming frames from video num 2:"),
+                self.max_in_flight or 2 * self.jobs)
+            return True
+        self.phase2_images = self._extract_images_to_folder(
+            input_args, self.vid2_size, self.vid2_raw_images_folder,
+            "command used for extracting images from video num 2:")
         if len(self.phase2_images) < in_num_frames:
             log_error(f"could not extract [{in_num_frames}] images from the second video "
                       f"({len(self.phase2_images)} extracted)")
@@ -801,6 +2907,157 @@ class DataHandler:
             self.phase2_images = self.phase2_images[:in_num_frames]
         return True
 
+    def _last_frames_args(self, in_video, in_num_frames):
+        """ffmpeg input arguments decoding a video from the key frame preceding its last 'in_num_frames' frames"""
+        probe = self._probe(in_video)
+        if probe is None:
+            return None
+        if probe.num_frames() < in_num_frames:
+            return ["-i", str(in_video)]
+        seek_time, num_decoded = probe.key_frame_before(probe.num_frames() - in_num_frames)
+        log_debug(f"[{in_video.name}]: last [{in_num_frames}] frames, decoding [{num_decoded}] frames from "
+                  f"[{seek_time:.3f} s]")
+        if seek_time <= 0:
+            return ["-i", str(in_video)]
+        return [*self._seek_args(seek_time), "-i", str(in_video)]
+
+    @staticmethod
+    def _seek_args(in_key_frame_time):
+        """ffmpeg input arguments starting the decoding exactly at a key frame: without accurate seeking, all the frames
+        from the key frame are kept. The position is 1 us after it, so that its rounding never sends the seek to the
+        previous key frame"""
+        return ["-noaccurate_seek", "-ss", f"{in_key_frame_time + 0.000001:.6f}"]
+
+    @staticmethod
+    def _first_frames_args(in_video, in_num_frames):
+        return ["-i", str(in_video), "-frames:v", str(in_num_frames)]
+
+    def _probe(self, in_video):
+        probe = MediaProbe.for_video(in_video, self.render_options.cache_dir)
+        if probe is None:
+            log_error(f"could not probe the video (using ffprobe): {in_video}")
+        return probe
+
+    def _first_frames(self, in_video, in_size, in_num_frames, in_presentation):
+        """generator of the first frames of a video, read from the frame cache if they are all in it, decoded (and
+        saved into the frame cache) otherwise"""
+        cached = self._cached_frames(in_video, in_size, range(in_num_frames))
+        if cached is not None:
+            return cached
+        return self._store_frames(in_video, in_size, 0, self._stream_images_from_memory(
+            self._first_frames_args(in_video, in_num_frames), in_size, in_presentation, in_num_frames))
+
+    def _last_frames(self, in_video, in_size, in_num_frames, in_input_args, in_presentation):
+        """list of the last frames of a video, read from the frame cache if they are all in it, decoded from
+        'in_input_args' (and saved into the frame cache) otherwise"""
+        num_frames = self._probe(in_video).num_frames()
+        indices = range(num_frames - in_num_frames, num_frames)
+        cached = self._cached_frames(in_video, in_size, indices)
+        if cached is not None:
+            try:
+                return list(cached)
+            except ValueError as error:
+                log_debug(str(error))
+        images = self._extract_images_to_memory(in_input_args, in_size, in_presentation, keep_last=in_num_frames)
+        if len(images) != in_num_frames:
+            return images
+        return list(self._store_frames(in_video, in_size, indices.start, images))
+
+    def _cached_frames(self, in_video, in_size, in_indices):
+        """generator of the frames 'in_indices' (in presentation order) of a video read from the frame cache, None if
+        they are not all in it. ValueError is raised if a frame cannot be read"""
+        if self.frame_cache is None or in_indices.start < 0:
+            return None
+        entry = self.frame_cache.entry(in_video, in_size)
+        if not self.frame_cache.has(entry, in_size, in_indices):
+            log_debug(f"[{in_video.name}]: frames [{in_indices.start}, {in_indices.stop - 1}] not in the frame cache")
+            return None
+        log_debug(f"[{in_video.name}]: frames [{in_indices.start}, {in_indices.stop - 1}] read from the frame cache: "
+                  f"{entry}")
+
+        def read_frames():
+            num_read = 0
+            try:
+                for idx in in_indices:
+                    try:
+                        img = self.frame_cache.read(entry, idx, in_size)
+                    except (OSError, ValueError) as error:
+                        raise ValueError(f"could not read the frame [{idx}] of [{in_video.name}] from the frame "
+                                         f"cache: {error}")
+                    num_read += 1
+                    yield img
+            finally:
+                self._count_decoded_frames(0, num_read, num_read)
+        return read_frames()
+
+    def _store_frames(self, in_video, in_size, in_first_idx, in_images):
+        """generator of 'in_images' saving them into the frame cache (if it is set) as they go, their indices start at
+        'in_first_idx'"""
+        entry = None if self.frame_cache is None or in_first_idx < 0 else self.frame_cache.entry(in_video, in_size)
+        for idx, img in enumerate(in_images, in_first_idx):
+            if entry is not None:
+                self.frame_cache.write(entry, idx, img)
+            yield img
+        if entry is not None:
+            self.frame_cache.evict()
+
+    def _count_decoded_frames(self, in_decoded, in_used, in_cached=0):
+        with self.decode_stats_lock:
+            self.decode_stats["decoded"] += in_decoded
+            self.decode_stats["used"] += in_used
+            self.decode_stats["cached"] += in_cached
+
+    def log_decode_stats(self):
+        log_info(f"frames decoded: [{self.decode_stats['decoded']}], used by the transitions: "
+                 f"[{self.decode_stats['used']}]" + ("" if self.frame_cache is None else
+                                                    f", read from the frame cache: [{self.decode_stats['cached']}]"))
+
+    def _extract_images_to_folder(self, in_input_args, in_size, in_folder, in_presentation, keep_last=None):
+        # the frames are written as they are decoded, without duplicating or dropping any of them
+        cmd = ["ffmpeg", "-hide_banner", *in_input_args, *self._scale_args(in_size), "-an", "-sn", "-fps_mode",
+               "passthrough", str(in_folder / "%04d.png")]
+        self._exec_command(cmd, in_presentation)
+        images = [img_f for img_f in in_folder.glob("*.png")]
+        images.sort()
+        num_decoded = len(images)
+        if keep_last is not None and len(images) > keep_last:
+            for img_f in images[:-keep_last]:
+                img_f.unlink()
+            images = images[-keep_last:]
+        self._count_decoded_frames(num_decoded, len(images))
+        return images
+
+    def _stream_images_from_memory(self, in_input_args, in_size, in_presentation, in_num_frames):
+        """generator of the frames decoded by ffmpeg, they are only decoded as they are requested. ValueError is raised
+        if the video has less than 'in_num_frames' frames"""
+        cmd = ["ffmpeg", "-hide_banner", *in_input_args, *self._scale_args(in_size), "-an", "-sn", "-fps_mode",
+               "passthrough", "-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+        decoder = FFmpegPipe(cmd, in_presentation, in_size)
+        try:
+            for _ in range(in_num_frames):
+                img = decoder.read_frame()
+                if img is None:
+                    raise ValueError(f"could not extract [{in_num_frames}] images ({decoder.num_frames} extracted)")
+                yield img
+        finally:
+            decoder.close()
+            self._count_decoded_frames(decoder.num_frames, decoder.num_frames)
+
+    def _extract_images_to_memory(self, in_input_args, in_size, in_presentation, keep_last=None):
+        """decodes raw RGB frames from ffmpeg stdout, if 'keep_last' is set only the last frames are kept in memory"""
+        cmd = ["ffmpeg", "-hide_banner", *in_input_args, *self._scale_args(in_size), "-an", "-sn", "-fps_mode",
+               "passthrough", "-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+        images = collections.deque(maxlen=keep_last)
+        decoder = FFmpegPipe(cmd, in_presentation, in_size)
+        img = decoder.read_frame()
+        while img is not None:
+            images.append(img)
+            img = decoder.read_frame()
+        decoder.close()
+        log_debug(f"frames decoded: [{decoder.num_frames}], kept in memory: [{len(images)}]")
+        self._count_decoded_frames(decoder.num_frames, len(images))
+        return list(images)
+
     @staticmethod
     def _exec_command(in_cmd, in_presentation):
         log_debug("")
@@ -821,24 +3078,42 @@ class DataHandler:
         log_debug("")
         return res.stdout, res.stderr
 
-    def _get_fps_from_video(self):
-        cmd = ["ffmpeg", "-hide_banner", "-i", str(self.input_vid1)]
-        stdout, stderr = self._exec_command(cmd, "command used for extracting FPS")
-        res = (stdout.lower() + " " + stderr.lower()).split(" ")
-        log_debug("searching for FPS value in ffmpeg video information")
-        for fps_word in ["fps", "fps,"]:
-            for idx, word in enumerate(res):
-                if word == fps_word:
-                    try:
-                        self.fps = int(res[idx - 1])
-                        log_debug(f"FPS extracted from video [{self.fps}]")
-                        return
-                    except ValueError:
-                        log_debug(f"failed extract FPS, value [{res[idx - 1]}], error :[{ValueError}]")
-
-        log_warning(f"cloud not retrieve FPS value from video (using ffmpeg): {self.input_vid1}")
-        log_warning("falling back to FPS value of [30]")
-        self.fps = 30
+    def _set_fps(self, in_video):
+        """a transition is encoded at the exact frame rate of its first video (a fraction, e.g. 30000/1001)"""
+        in_probe = self._probe(in_video)
+        fps = None if in_probe is None else in_probe.frame_rate()
+        if fps is None:
+            log_warning(f"could not retrieve the frame rate of the video (using ffprobe): {in_video}")
+            log_warning("falling back to FPS value of [30]")
+            fps = fractions.Fraction(30)
+        elif in_probe.is_variable_frame_rate():
+            log_info(f"[{in_video.name}] has a variable frame rate (base rate [{in_probe.stream['r_frame_rate']}]), "
+                     f"the transition is encoded at its average rate")
+        self.fps = fps
+        log_info(f"frames per second (FPS): {fps}" + ("" if fps.denominator == 1 else f" ({float(fps):.3f})"))
+
+    def report_profile(self, in_profile_path):
+        """logs the time spent in each stage (and in each frame action) and the peak memory, the report is also saved
+        as JSON into 'in_profile_path' if it is set"""
+        run_info = {"inputs": [str(video) for video in self.inputs], "animation": self.animation.name,
+                    "num_frames": list(self.num_frames), "frames_size": list(self.vid1_size), "fps": str(self.fps),
+                    "engine": self.engine, "geometry_engine": self.render_options.geometry_engine,
+                    "distortion_engine": self.render_options.distortion_engine,
+                    "blur_engine": self.render_options.blur_engine, "jobs": self.jobs,
+                    "frame_transport": self.render_options.frame_transport,
+                    "preview": self.preview, "frames_decoded": self.decode_stats["decoded"],
+                    "frames_used": self.decode_stats["used"], "frames_cached": self.decode_stats["cached"]}
+        report = self.profiler.report(run_info)
+        log_msg = log_info if in_profile_path != "" else log_debug
+        log_msg("")
+        log_msg(" Profile ".center(80, "="))
+        for line in self.profiler.format_table(report):
+            log_msg(line)
+        if in_profile_path != "":
+            profile_path = pathlib.Path(in_profile_path)
+            profile_path.write_text(json.dumps(report, indent=2), encoding="utf8")
+            log_info(f"profile report saved into: {profile_path}")
+        return report
 
     def get_duration_msg(self):
         end_time = datetime.datetime.now()
@@ -874,22 +3149,6 @@ class DataHandler:
                     num += 1
         self.output = cur_dir / f"vt{num}"
 
-    def merge_video_chunks(self):  # TODO implement
-        log_info("merging the two phases video chunks into one transition video")
-        cmd = ["ffmpeg", "-hide_banner", "-i", str(self.phase1_vid), "-i",  str(self.phase2_vid),
-               "-filter_complex", "[0:v] [1:v] concat=n=2:v=1 [v]", "-map", "[v]", str(self.merged_vid)]
-        self._exec_command(cmd, f"command used for merging phase video chunks into the output video ...")
-
-        if not self.merged_vid.is_file():
-            log_error(f"ffmpeg failed to merge video phases into: {self.merged_vid}")
-            return False
-
-        log_debug(f"remove output video phase1: {self.phase1_vid}")
-        self.phase1_vid.unlink(missing_ok=True)
-        log_debug(f"remove output video phase2: {self.phase2_vid}")
-        self.phase2_vid.unlink(missing_ok=True)
-        return True
-
     @staticmethod
     def _setup_logging(debug, log_file_path):
         init_logger = logging.getLogger(__package__)
@@ -925,8 +3184,11 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
                                      description='make a transition animation between two videos, using the last part '
                                                  'of the first video, and the first part of the second video')
-    parser.add_argument('-i', '--input', help='input videos, must be two', type=str,  nargs='+', metavar='\b',
+    parser.add_argument('-i', '--input', help='input videos, two videos or more (a transition is rendered between '
+                                              'each pair of consecutive videos)', type=str,  nargs='*', metavar='\b',
                         default=INPUT_VIDEOS)
+    parser.add_argument('--manifest', help='text file listing input videos in order (one per line), they are added '
+                                           'after the "--input" videos', type=str, default=MANIFEST, metavar='\b')
     parser.add_argument('-n', '--num_frames', help='the number of frames used for each animation phase, '
                                                    'most animations consists of two phases',
                         type=int, default=NUM_FRAMES, metavar='\b')
@@ -954,11 +3216,84 @@ if __name__ == "__main__":
     parser.add_argument('-g', '--debug', help='this will show more info, will create a logs file, '
                                               'and will create a folder which contains animation images',
                         type=str2bool, default=DEBUG, metavar='\b')
+    parser.add_argument('--debug_format', help=f'file format of the animation images saved in debug mode, possible '
+                                               f'values: {", ".join(_DEBUG_FORMATS)} ("bmp" images are not compressed, '
+                                               f'they are the fastest to write)',
+                        type=str, default=DEBUG_FORMAT, metavar='\b')
+    parser.add_argument('--debug_compress_level', help='zlib compression level (0 to 9) of the png images saved in '
+                                                       'debug mode, lower is faster to write but gives larger files',
+                        type=int, default=DEBUG_COMPRESS_LEVEL, metavar='\b')
     parser.add_argument('-t', '--art', help='Display ASCII art', type=str2bool, default=ART, metavar='\b')
     parser.add_argument('-e', '--remove', help='delete original videos after a successful animation creation',
                         type=str2bool, default=REMOVE_ORIGINAL, metavar='\b')
     parser.add_argument('-m', '--merge', help='merge both phases video chunks into one transition video',
                         type=str2bool, default=MERGE_PHASES, metavar='\b')
+    parser.add_argument('--full_sequence', help='output the whole sequence (first video, transition, second video) '
+                                                'in one file, the footage around the transition is stream-copied',
+                        type=str2bool, default=FULL_SEQUENCE, metavar='\b')
+    parser.add_argument('-j', '--jobs', help='number of processes used to render the transition frames '
+                                             '(0 means all CPU cores)', type=int, default=JOBS, metavar='\b')
+    parser.add_argument('--engine', help=f'what renders the transition, possible values: {", ".join(_ENGINES)} '
+                                         f'("ffmpeg" renders everything in one ffmpeg process without going through '
+                                         f'python, its result is close to but not exactly the same as "pil")',
+                        type=str, default=ENGINE, metavar='\b')
+    parser.add_argument('--distortion_engine', help=f'how the lens distortion is computed, possible values: '
+                                                    f'{", ".join(_DISTORTION_ENGINES)} ("remap" engines compute the '
+                                                    f'exact per-pixel distortion but need numpy)',
+                        type=str, default=DISTORTION_ENGINE, metavar='\b')
+    parser.add_argument('--blur_engine', help=f'how the gaussian blur is computed, possible values: '
+                                              f'{", ".join(_BLUR_ENGINES)} ("pyramid" blurs a reduced frame, its cost '
+                                              f'does not grow with the blur strength, the result is close to but not '
+                                              f'exactly the same as "gaussian")',
+                        type=str, default=BLUR_ENGINE, metavar='\b')
+    parser.add_argument('--frame_transport', help=f'how the frames are sent to the rendering processes (jobs > 1), '
+                                                  f'possible values: {", ".join(_FRAME_TRANSPORTS)} ("shared_memory" '
+                                                  f'copies each frame once into a shared ring of slots, "pickle" sends '
+                                                  f'it through the process pool queues)',
+                        type=str, default=FRAME_TRANSPORT, metavar='\b')
+    parser.add_argument('--geometry_engine', help=f'how the mirror, zoom, rotation and crop effects are computed, '
+                                                  f'possible values: {", ".join(_GEOMETRY_ENGINES)} ("fused" engines '
+                                                  f'resample each frame only once but need numpy)',
+                        type=str, default=GEOMETRY_ENGINE, metavar='\b')
+    parser.add_argument('--distortion_cache_mb', help='memory budget (in MB) of the cache of lens distortion meshes '
+                                                      'and maps, per rendering process', type=int,
+                        default=DISTORTION_CACHE_MB, metavar='\b')
+    parser.add_argument('--cache_dir', help='folder where computed data is kept between runs (nothing is kept if '
+                                            'left empty)', type=str, default=CACHE_DIR, metavar='\b')
+    parser.add_argument('--threads', help='threads used by each rendering process to compute the blur, distortion, '
+                                          'brightness and resampling of large frames by bands of rows (0 shares the '
+                                          'CPU cores between the rendering processes)', type=int, default=THREADS,
+                        metavar='\b')
+    parser.add_argument('--encoder_profile', help=f'settings of the transition encodes, possible values: '
+                                                  f'{", ".join(_ENCODER_PROFILES)} ("default" leaves them to ffmpeg, '
+                                                  f'"fast_intermediate" is quick to encode and made of intra frames '
+                                                  f'only for editing, "delivery" is slow and high quality, "lossless" '
+                                                  f'keeps the exact RGB frames)',
+                        type=str, default=ENCODER_PROFILE, metavar='\b')
+    parser.add_argument('--encoder_threads', help='threads used by each encoder (0 lets ffmpeg choose, which uses all '
+                                                  'the CPU cores for each encoder: set it when several encoders or '
+                                                  'transitions run at the same time)', type=int,
+                        default=ENCODER_THREADS, metavar='\b')
+    parser.add_argument('--max_memory', help='memory budget (in MB) of the rendering, the number of rendering '
+                                             'processes is lowered to stay within it (0 means no limit)', type=int,
+                        default=MAX_MEMORY, metavar='\b')
+    parser.add_argument('--profile', help='JSON file where the time spent in each stage and frame action, and the peak '
+                                          'memory are saved (the same report is printed as a table)', type=str,
+                        default=PROFILE, metavar='\b')
+    parser.add_argument('--render_cache_mb', help='size budget (in MB) of the rendered transitions kept in the cache '
+                                                  'folder (the least recently used ones are removed first)', type=int,
+                        default=RENDER_CACHE_MB, metavar='\b')
+    parser.add_argument('--frame_cache_mb', help='size budget (in MB) of the decoded frames kept in the cache folder, '
+                                                 'repeated renders of the same videos then skip their decoding (0 '
+                                                 'disables it)', type=int, default=FRAME_CACHE_MB, metavar='\b')
+    parser.add_argument('--no_cache', help='render the transition even if it is in the cache folder (and do not save '
+                                           'it there)', type=str2bool, default=NO_CACHE, metavar='\b')
+    parser.add_argument('--preview', help='renders a quick low quality preview with the frames downscaled by this '
+                                          'factor (e.g. 0.25), as a video and a contact sheet image (0 renders the '
+                                          'actual transition)', type=float, default=PREVIEW, metavar='\b')
+    parser.add_argument('--open_preview', help='open the contact sheet of the preview once it is rendered (if not '
+                                               'set, it is only opened when a display is detected)',
+                        type=str2bool, default=OPEN_PREVIEW, metavar='\b')
     args = parser.parse_args()
 
     if args.animation.lower() == "help":
@@ -976,23 +3311,58 @@ if __name__ == "__main__":
 
         phase1_actions, phase2_actions = actions_determinator.get_actions_values(dh.animation)
 
-        final_phase_folder = AnimationImages.make_transition(dh.tmp_path, dh.phase1_images, dh.phase2_images,
-                                                             phase1_actions, phase2_actions, args.debug)
-
-        if not dh.final_images_to_video(final_phase_folder):
-            exit(1)
-        if args.merge:
-            if not dh.merge_video_chunks():
+        if dh.cached:
+            pass
+        elif dh.is_batch():
+            if not dh.render_batch(phase1_actions, phase2_actions, args.debug):
+                exit(1)
+        elif dh.engine == "ffmpeg":
+            if not dh.render_with_ffmpeg(phase1_actions, phase2_actions, args.merge):
+                exit(1)
+        else:
+            phase_encoders = dh.open_phase_encoders()
+            if dh.full_sequence:
+                with dh.profiler.stage("full sequence (head frames)"):
+                    dh.write_sequence_frames(phase_encoders[0], head=True)
+            try:
+                with dh.profiler.stage("rendering"):
+                    AnimationImages.make_transition(dh.tmp_path, dh.phase1_images, dh.phase2_images, phase1_actions,
+                                                    phase2_actions, phase_encoders, dh.render_options, args.debug,
+                                                    dh.jobs, profiler=dh.profiler, max_in_flight=dh.max_in_flight)
+            except ValueError as error:
+                log_error(f"the second video could not be decoded: {error}")
+                dh.close_phase_encoders(phase_encoders)
+                exit(1)
+            dh.log_decode_stats()
+            if dh.full_sequence:
+                with dh.profiler.stage("full sequence (tail frames)"):
+                    dh.write_sequence_frames(phase_encoders[0], head=False)
+            if not dh.close_phase_encoders(phase_encoders):
                 exit(1)
+        if dh.is_batch():
+            log_info(f"output transitions videos: {dh.output.parent / (dh.output.stem + '_*' + _OUTPUT_VIDEO_TYPE)}")
+        elif dh.full_sequence:
+            if not dh.cached:
+                with dh.profiler.stage("full sequence assembly"):
+                    if not dh.assemble_full_sequence():
+                        exit(1)
+            log_info(f"output full sequence video: {dh.full_vid}")
+        elif dh.preview > 0:
+            log_info(f"output preview video: {dh.preview_vid}")
+            log_info(f"output preview contact sheet: {dh.preview_sheet}")
+            dh.open_preview(args.open_preview)
+        elif args.merge:
             log_info(f"output transition video: {dh.merged_vid}")
         else:
             log_info(f"output transition phase1 video: {dh.phase1_vid}")
             log_info(f"output transition phase2 video: {dh.phase2_vid}")
-        if args.remove:
-            log_debug(f"remove original video1: {dh.input_vid1}")
-            dh.input_vid1.unlink()
-            log_debug(f"remove original video2: {dh.input_vid2}")
-            dh.input_vid2.unlink()
+        dh.store_render()
+        if args.remove and dh.preview > 0:
+            log_warning("the input videos are not deleted after a preview")
+        elif args.remove:
+            dh.remove_inputs()
+        dh.check_memory()
+        dh.report_profile(args.profile)
         log_info("")
         log_info((f" Transition finished. Duration = {dh.get_duration_msg()} ".center(80, "=")))
         log_info("")
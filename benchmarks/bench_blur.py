@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Compares the blur engines of 'vid_transition' with the gaussian blur (speed and pixel error).
+
+The frame is a sharp synthetic pattern (ffmpeg testsrc2 like bars, edges and noise), blurred at the strengths reached by
+the transitions. The exit code is 1 if an engine is below the PSNR threshold, or above the max error threshold.
+"""
+import sys
+import time
+import math
+import pathlib
+import argparse
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "Scripts"))
+import vid_transition as vt  # noqa: E402
+
+RESOLUTIONS = {"1080p": (1920, 1080), "4k": (3840, 2160)}
+BLUR_VALUES = [0.005, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0]
+REPEAT = 3
+MIN_PSNR = 40.0
+# the largest errors are on the border of the noise area: the gaussian blur repeats the noisy border pixels, while
+# the reduced frame already averages them
+MAX_ERROR = 32
+
+
+def make_frame(size):
+    w, h = size
+    rng = np.random.default_rng(0)
+    frame = Image.fromarray(rng.integers(0, 256, (h, w, 3), dtype=np.uint8))
+    draw = ImageDraw.Draw(frame)
+    colors = [(255, 255, 255), (255, 255, 0), (0, 255, 255), (0, 255, 0), (255, 0, 255), (255, 0, 0), (0, 0, 255)]
+    for idx, color in enumerate(colors):
+        draw.rectangle((idx * w // 7, 0, (idx + 1) * w // 7, h // 2), fill=color)
+    for x in range(0, w, max(4, w // 64)):
+        draw.line((x, h // 2, x, h * 3 // 4), fill=(0, 0, 0), width=2)
+    return frame
+
+
+def measure(frame, blur_value, engine):
+    best = math.inf
+    res = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        res = vt.AnimationImages.blur_effect(frame, blur_value, engine=engine)
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                     description='benchmark of the blur engines of vid_transition')
+    parser.add_argument('-r', '--resolutions', help=f'resolutions to test, possible values: {list(RESOLUTIONS)}',
+                        type=str, nargs='+', default=list(RESOLUTIONS), metavar='\b')
+    parser.add_argument('-b', '--blur_values', help='blur values to test (as given to -b)', type=float, nargs='+',
+                        default=BLUR_VALUES, metavar='\b')
+    parser.add_argument('-p', '--min_psnr', help='lowest accepted PSNR (dB)', type=float, default=MIN_PSNR,
+                        metavar='\b')
+    parser.add_argument('-m', '--max_error', help='highest accepted pixel error', type=int, default=MAX_ERROR,
+                        metavar='\b')
+    args = parser.parse_args()
+
+    failed = []
+    print(f"{'resolution':<11s}{'blur':>7s}{'strength':>10s}  {'engine':<10s}{'time (s)':>9s}{'speedup':>9s}"
+          f"{'mean err':>10s}{'max err':>9s}{'PSNR (dB)':>11s}")
+    for res_name in args.resolutions:
+        frame = make_frame(RESOLUTIONS[res_name.lower()])
+        strength = min(frame.size) * 0.1
+        for blur_value in args.blur_values:
+            reference_time, reference = measure(frame, blur_value, "gaussian")
+            exact = np.asarray(reference, dtype=np.float64)
+            for engine in vt._BLUR_ENGINES:
+                duration, res = measure(frame, blur_value, engine)
+                diff = np.abs(np.asarray(res, dtype=np.float64) - exact)
+                mse = np.mean(diff ** 2)
+                psnr = 10 * math.log10(255 ** 2 / mse) if mse > 0 else math.inf
+                ok = psnr >= args.min_psnr and diff.max() <= args.max_error
+                if not ok:
+                    failed.append(f"{res_name} {blur_value} {engine}")
+                print(f"{res_name:<11s}{blur_value:>7.3f}{strength * blur_value:>10.1f}  {engine:<10s}{duration:>9.3f}"
+                      f"{reference_time / duration:>9.1f}{diff.mean():>10.3f}{diff.max():>9.0f}{psnr:>11.2f}"
+                      f"{'' if ok else '  <- above the error bounds'}")
+    if len(failed) > 0:
+        print(f"blur engines out of the error bounds for: {', '.join(failed)}")
+        sys.exit(1)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Compares the lens distortion engines of 'vid_transition' (speed and pixel error).
+
+The input frame is a smooth analytic pattern, so the exact distorted frame can be computed for every pixel: the pixel
+error of each engine is measured against it (mean and max absolute error over the RGB values, and PSNR).
+"""
+import sys
+import time
+import math
+import pathlib
+import argparse
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "Scripts"))
+import vid_transition as vt  # noqa: E402
+
+RESOLUTIONS = {"1080p": (1920, 1080), "4k": (3840, 2160)}
+STRENGTHS = [0.3, 0.7, 1.0]
+REPEAT = 3
+
+
+def pattern(x, y):
+    """RGB values of the analytic test pattern at (float) pixel coordinates"""
+    channels = [127.5 + 127.5 * np.sin(x / 23.0) * np.cos(y / 31.0),
+                127.5 + 127.5 * np.sin((x + y) / 17.0),
+                127.5 + 127.5 * np.cos(np.hypot(x, y) / 41.0)]
+    return np.stack(channels, axis=-1)
+
+
+def make_frames(size, strength):
+    w, h = size
+    x, y = np.meshgrid(np.arange(w) + 0.5, np.arange(h) + 0.5)
+    frame = Image.fromarray(np.round(pattern(x, y)).astype(np.uint8))
+    deformation = vt.AnimationImages.PincushionDeformation(strength, 1.0)
+    map_x, map_y = deformation.getmap(frame)
+    exact = pattern(map_x.astype(np.float64) + 0.5, map_y.astype(np.float64) + 0.5)
+    return frame, exact
+
+
+def measure(frame, exact, strength, engine):
+    best = math.inf
+    res = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        res = vt.AnimationImages.distortion_effect(frame, strength, engine)
+        best = min(best, time.perf_counter() - start)
+    # the border is excluded, engines do not handle the samples falling outside of the frame the same way
+    diff = np.abs(np.asarray(res, dtype=np.float64) - exact)[2:-2, 2:-2]
+    mse = np.mean(diff ** 2)
+    psnr = 10 * math.log10(255 ** 2 / mse) if mse > 0 else math.inf
+    return best, diff.mean(), diff.max(), psnr
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                     description='benchmark of the lens distortion engines of vid_transition')
+    parser.add_argument('-r', '--resolutions', help=f'resolutions to test, possible values: {list(RESOLUTIONS)}',
+                        type=str, nargs='+', default=list(RESOLUTIONS), metavar='\b')
+    parser.add_argument('-s', '--strengths', help='distortion strengths to test', type=float, nargs='+',
+                        default=STRENGTHS, metavar='\b')
+    parser.add_argument('-e', '--engines', help='distortion engines to test', type=str, nargs='+',
+                        default=vt._DISTORTION_ENGINES, metavar='\b')
+    args = parser.parse_args()
+
+    print(f"{'resolution':<11s}{'strength':>9s}  {'engine':<15s}{'time (s)':>9s}{'mean err':>10s}{'max err':>9s}"
+          f"{'PSNR (dB)':>11s}")
+    for res_name in args.resolutions:
+        for strength in args.strengths:
+            frame, exact = make_frames(RESOLUTIONS[res_name.lower()], strength)
+            for engine in args.engines:
+                duration, mean_err, max_err, psnr = measure(frame, exact, strength, engine)
+                print(f"{res_name:<11s}{strength:>9.0%}  {engine:<15s}{duration:>9.3f}{mean_err:>10.3f}"
+                      f"{max_err:>9.1f}{psnr:>11.2f}")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Benchmark of 'vid_transition' over all its animations, at several resolutions and numbers of frames.
+
+The input clips are generated locally with the ffmpeg testsrc2 source (and kept in '--clips_dir' if it is set, so that
+they are generated only once). Each transition is rendered by the script with '--profile', the results (frames per
+second, wall time, peak memory and output size) can be saved as JSON and compared with a previous run, the exit code is
+1 if a regression above the tolerance is found.
+"""
+import sys
+import json
+import math
+import time
+import pathlib
+import argparse
+import tempfile
+import subprocess
+
+SCRIPT = pathlib.Path(__file__).resolve().parent.parent / "Scripts" / "vid_transition.py"
+RESOLUTIONS = {"480p": (854, 480), "1080p": (1920, 1080), "4k": (3840, 2160)}
+ANIMATIONS = ["rotation", "rotation_inv", "zoom_in", "zoom_out", "translation", "translation_inv", "long_translation",
+              "long_translation_inv"]
+NUM_FRAMES = [10, 30]
+FPS = 30
+TOLERANCE = 0.15
+# metrics compared between two runs, and whether a higher value is better
+METRICS = {"fps": True, "wall_seconds": False, "peak_rss_mb": False}
+
+
+def run(cmd):
+    res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if res.returncode != 0:
+        print(res.stdout)
+        raise RuntimeError(f"command failed: {' '.join(cmd)}")
+    return res.stdout
+
+
+def make_clips(folder, resolution, duration):
+    """two different clips per resolution (the second one is a shifted part of the pattern)"""
+    w, h = RESOLUTIONS[resolution]
+    clips = []
+    for idx in range(2):
+        clip = folder / f"testsrc2_{resolution}_{duration}s_{idx + 1}.mp4"
+        if not clip.is_file():
+            source = f"testsrc2=size={w}x{h}:rate={FPS}:duration={duration + 5 * idx}"
+            trim = ["-ss", str(5 * idx)] if idx > 0 else []
+            run(["ffmpeg", "-hide_banner", "-y", "-f", "lavfi", "-i", source, *trim, "-pix_fmt", "yuv420p", "-vcodec",
+                 "h264", str(clip)])
+        clips.append(clip)
+    return clips
+
+
+def render(clips, animation, num_frames, folder, extra_args):
+    output = folder / f"{animation}_{num_frames}.mp4"
+    profile = folder / f"{animation}_{num_frames}.json"
+    start = time.perf_counter()
+    run([sys.executable, str(SCRIPT), "-i", str(clips[0]), str(clips[1]), "-o", str(output), "-a", animation,
+         "-n", str(num_frames), "-m", "true", "-t", "false", "--profile", str(profile)] + extra_args)
+    wall = time.perf_counter() - start
+    report = json.loads(profile.read_text())
+    merged = output.parent / f"{output.stem}_merged{output.suffix}"
+    num_rendered = sum(report["run"]["num_frames"])
+    peak = report["peak_rss_bytes"] or {"self": 0, "children": 0}
+    return {"wall_seconds": round(wall, 3), "fps": round(num_rendered / wall, 3), "frames": num_rendered,
+            "peak_rss_mb": round(max(peak["self"], peak["children"]) / 2 ** 20, 1),
+            "output_bytes": merged.stat().st_size,
+            "stages": {entry["name"]: entry["seconds"] for entry in report["stages"]}}
+
+
+def compare(baseline, current, tolerance):
+    """prints the relative change of each metric, returns the list of regressions above the tolerance"""
+    regressions = []
+    print(f"{'case':<36s}" + "".join(f"{metric:>28s}  " for metric in METRICS))
+    for case, result in current.items():
+        if case not in baseline:
+            continue
+        line = f"{case:<36s}"
+        for metric, higher_is_better in METRICS.items():
+            old, new = baseline[case][metric], result[metric]
+            change = (new - old) / old if old > 0 else 0.0
+            worse = -change if higher_is_better else change
+            flag = " !" if worse > tolerance else "  "
+            if worse > tolerance:
+                regressions.append(f"{case} {metric}")
+            line += f"{old:>10.2f} ->{new:>9.2f}{change:>+6.0%}{flag}"
+        print(line)
+    return regressions
+
+
+def load_results(path):
+    return json.loads(pathlib.Path(path).read_text())["results"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                     description='benchmark of vid_transition over all animations and resolutions')
+    parser.add_argument('-r', '--resolutions', help=f'resolutions to test, possible values: {list(RESOLUTIONS)}',
+                        type=str, nargs='+', default=list(RESOLUTIONS), metavar='\b')
+    parser.add_argument('-a', '--animations', help='animations to test', type=str, nargs='+', default=ANIMATIONS,
+                        metavar='\b')
+    parser.add_argument('-n', '--num_frames', help='numbers of frames per phase to test', type=int, nargs='+',
+                        default=NUM_FRAMES, metavar='\b')
+    parser.add_argument('-x', '--extra', help='arguments passed to vid_transition (quoted, e.g. "-j 1 -d 0")',
+                        type=str, default="", metavar='\b')
+    parser.add_argument('-c', '--clips_dir', help='folder where the generated clips are kept between runs (temporary '
+                                                  'if left empty)', type=str, default="", metavar='\b')
+    parser.add_argument('-o', '--output', help='JSON file where the results are saved', type=str, default="",
+                        metavar='\b')
+    parser.add_argument('-b', '--baseline', help='results of a previous run (JSON) to compare with', type=str,
+                        default="", metavar='\b')
+    parser.add_argument('--compare', help='only compare two saved results (baseline then current)', type=str,
+                        nargs=2, default=None, metavar='\b')
+    parser.add_argument('-t', '--tolerance', help='relative change of a metric counted as a regression', type=float,
+                        default=TOLERANCE, metavar='\b')
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        regressions = compare(load_results(args.compare[0]), load_results(args.compare[1]), args.tolerance)
+    else:
+        results = {}
+        duration = int(math.ceil(2 * max(args.num_frames) / FPS)) + 2
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = pathlib.Path(tmp)
+            clips_dir = pathlib.Path(args.clips_dir) if args.clips_dir != "" else tmp
+            clips_dir.mkdir(parents=True, exist_ok=True)
+            print(f"{'resolution':<11s}{'animation':<22s}{'frames':>7s}{'fps':>8s}{'wall (s)':>10s}{'peak (MB)':>11s}"
+                  f"{'size (KB)':>11s}")
+            for resolution in args.resolutions:
+                resolution = resolution.lower()
+                clips = make_clips(clips_dir, resolution, duration)
+                for animation in args.animations:
+                    for num_frames in args.num_frames:
+                        result = render(clips, animation, num_frames, tmp, args.extra.split())
+                        results[f"{resolution}/{animation}/{num_frames}"] = result
+                        print(f"{resolution:<11s}{animation:<22s}{result['frames']:>7d}{result['fps']:>8.2f}"
+                              f"{result['wall_seconds']:>10.2f}{result['peak_rss_mb']:>11.1f}"
+                              f"{result['output_bytes'] / 1024:>11.1f}")
+        if args.output != "":
+            info = {"extra": args.extra, "python": sys.version.split()[0], "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+            pathlib.Path(args.output).write_text(json.dumps({"info": info, "results": results}, indent=2))
+            print(f"results saved into: {args.output}")
+        regressions = []
+        if args.baseline != "":
+            print("")
+            regressions = compare(load_results(args.baseline), results, args.tolerance)
+    if len(regressions) > 0:
+        print(f"regressions above {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
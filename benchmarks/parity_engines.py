@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Visual parity check between the 'pil' and the 'ffmpeg' engines of 'vid_transition'.
+
+Two synthetic clips are generated with ffmpeg (testsrc2 and testsrc), every animation is rendered by both engines and
+the merged results are compared with the ffmpeg psnr and ssim filters. The exit code is 1 if one of the animations is
+below the thresholds.
+"""
+import re
+import sys
+import pathlib
+import argparse
+import tempfile
+import subprocess
+
+SCRIPT = pathlib.Path(__file__).resolve().parent.parent / "Scripts" / "vid_transition.py"
+SOURCES = ["testsrc2", "testsrc"]
+ANIMATIONS = ["rotation", "rotation_inv", "zoom_in", "zoom_out", "translation", "translation_inv", "long_translation",
+              "long_translation_inv"]
+MIN_PSNR = 24.0
+MIN_SSIM = 0.85
+
+
+def run(cmd):
+    res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if res.returncode != 0:
+        print(res.stdout)
+        raise RuntimeError(f"command failed: {' '.join(cmd)}")
+    return res.stdout
+
+
+def make_clips(folder, size, fps, duration):
+    clips = []
+    for source in SOURCES:
+        clip = folder / f"{source}.mp4"
+        run(["ffmpeg", "-hide_banner", "-y", "-f", "lavfi", "-i", f"{source}=size={size}:rate={fps}:duration={duration}",
+             "-pix_fmt", "yuv420p", "-vcodec", "h264", str(clip)])
+        clips.append(clip)
+    return clips
+
+
+def render(clips, animation, engine, output, extra_args):
+    run([sys.executable, str(SCRIPT), "-i", str(clips[0]), str(clips[1]), "-o", str(output), "-a", animation,
+         "-m", "true", "-t", "false", "--engine", engine] + extra_args)
+    return output.parent / f"{output.stem}_merged{output.suffix}"
+
+
+def compare(video1, video2):
+    out = run(["ffmpeg", "-hide_banner", "-i", str(video1), "-i", str(video2), "-lavfi",
+               "[0:v]split[a0][a1];[1:v]split[b0][b1];[a0][b0]psnr;[a1][b1]ssim", "-f", "null", "-"])
+    psnr = re.search(r"PSNR .*average:(\S+)", out).group(1)
+    ssim = re.search(r"SSIM .*All:(\S+)", out).group(1)
+    return float(psnr), float(ssim)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                     description='visual parity check of the pil and ffmpeg engines of vid_transition')
+    parser.add_argument('-a', '--animations', help='animations to check', type=str, nargs='+', default=ANIMATIONS,
+                        metavar='\b')
+    parser.add_argument('-s', '--size', help='size of the generated clips', type=str, default="320x240", metavar='\b')
+    parser.add_argument('-r', '--fps', help='frame rate of the generated clips', type=int, default=30, metavar='\b')
+    parser.add_argument('-p', '--min_psnr', help='lowest accepted PSNR (dB)', type=float, default=MIN_PSNR,
+                        metavar='\b')
+    parser.add_argument('-m', '--min_ssim', help='lowest accepted SSIM', type=float, default=MIN_SSIM, metavar='\b')
+    parser.add_argument('-x', '--extra', help='arguments passed to vid_transition (quoted, e.g. "-d 0 -b 0")',
+                        type=str, default="", metavar='\b')
+    args = parser.parse_args()
+
+    failed = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        clips = make_clips(tmp, args.size, args.fps, 3)
+        print(f"{'animation':<22s}{'PSNR (dB)':>10s}{'SSIM':>8s}")
+        for animation in args.animations:
+            video_pil = render(clips, animation, "pil", tmp / f"{animation}_pil.mp4", args.extra.split())
+            video_ffmpeg = render(clips, animation, "ffmpeg", tmp / f"{animation}_ffmpeg.mp4", args.extra.split())
+            psnr, ssim = compare(video_pil, video_ffmpeg)
+            ok = psnr >= args.min_psnr and ssim >= args.min_ssim
+            if not ok:
+                failed.append(animation)
+            print(f"{animation:<22s}{psnr:>10.2f}{ssim:>8.3f}{'' if ok else '  <- below threshold'}")
+    if len(failed) > 0:
+        print(f"engines differ for: {', '.join(failed)}")
+        sys.exit(1)